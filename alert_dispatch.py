@@ -0,0 +1,151 @@
+"""
+Alert Dispatch
+Fixed worker pool and bounded queue for alert handlers and notifications
+"""
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+
+class AlertDispatcher:
+    """
+    Delivers alerts to handlers from a fixed set of worker threads
+
+    `dispatch` and `submit` never block the caller: when the queue is full
+    the item is dropped and counted. A worker takes one item and then up to
+    `batch_size - 1` more that are already waiting; handlers registered with
+    batch=True get every alert of that batch in a single call, the others
+    get one call per alert. The workers start with the first queued item,
+    so an idle dispatcher costs no threads.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 1000,
+                 batch_size: int = 50):
+        self.batch_size = batch_size
+        self.handlers = []  # (handler, wants_batch)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=512)
+        self.enqueued = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.handler_errors = 0
+        self.max_latency = 0.0
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"alert-worker-{i}",
+                             daemon=True)
+            for i in range(workers)
+        ]
+        self._started = False
+
+    def add_handler(self, handler: Callable, batch: bool = False):
+        """Register handler(alert), or handler([alerts]) with batch=True"""
+        self.handlers.append((handler, batch))
+
+    def dispatch(self, alert: Dict) -> bool:
+        """Queue an alert for the handlers; False if it was dropped"""
+        if not self.handlers:
+            return True
+        return self._put(("alert", alert))
+
+    def submit(self, func: Callable, *args) -> bool:
+        """Queue any other notification work (e.g. an email send)"""
+        return self._put(("call", (func, args)))
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for worker in self._workers:
+            worker.start()
+
+    def _put(self, item) -> bool:
+        if not self._started:
+            self._start()
+        try:
+            self._queue.put_nowait((time.monotonic(), item))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _take_batch(self) -> List:
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _call(self, func: Callable, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            with self._lock:
+                self.handler_errors += 1
+            print(f"❌ Alert handler error: {e}")
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            started = time.monotonic()
+            try:
+                alerts = []
+                for _, (kind, payload) in batch:
+                    if kind == "alert":
+                        alerts.append(payload)
+                    else:
+                        func, args = payload
+                        self._call(func, *args)
+
+                if alerts:
+                    for handler, wants_batch in list(self.handlers):
+                        if wants_batch:
+                            self._call(handler, alerts)
+                        else:
+                            for alert in alerts:
+                                self._call(handler, alert)
+            finally:
+                with self._lock:
+                    for enqueued_at, _ in batch:
+                        latency = started - enqueued_at
+                        self._latencies.append(latency)
+                        self.max_latency = max(self.max_latency, latency)
+                    self.delivered += len(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def join(self):
+        """Block until everything queued so far has been handled"""
+        self._queue.join()
+
+    def get_stats(self) -> Dict:
+        """Queue depth, drop counts and queueing latency (ms)"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "workers": len(self._workers) if self._started else 0,
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "handler_errors": self.handler_errors,
+                "max_latency_ms": round(self.max_latency * 1000, 2)
+            }
+        if latencies:
+            stats["avg_latency_ms"] = round(sum(latencies) / len(latencies) * 1000, 2)
+            stats["p95_latency_ms"] = round(
+                latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2
+            )
+        else:
+            stats["avg_latency_ms"] = stats["p95_latency_ms"] = 0.0
+        return stats
@@ -0,0 +1,142 @@
+"""
+Alert Suppression
+Per-incident debouncing so repeated alerts cost one notification
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+DEFAULT_SETTINGS = {
+    "renotify_interval": 300,    # seconds before the same incident re-notifies
+    "alert_burst": 5,            # notifications a key may spend at once
+    "alert_refill_seconds": 900  # seconds to earn back one notification
+}
+
+
+class _KeyState:
+    __slots__ = ("tokens", "refilled_at", "notified_at",
+                 "suppressed", "suppressed_since", "last")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.refilled_at = now
+        self.notified_at = None
+        self.suppressed = 0
+        self.suppressed_since = None
+        self.last = None  # (message, severity, data) of the latest repeat
+
+
+class AlertSuppressor:
+    """
+    Decides which alerts notify, keyed by (alert type, IP)
+
+    A key may notify when its re-notify interval has passed since its last
+    notification and its token bucket has a token; a flapping incident
+    therefore gets at most `alert_burst` notifications before it is held
+    to one per `alert_refill_seconds`. Repeats in between are only
+    counted. The next notification for the key carries that count, and
+    `due()` hands out summaries for incidents that went quiet while
+    repeats were pending.
+
+    Settings are read from the given dict on every check, so they can be
+    changed at runtime through AlertManager.set_threshold.
+    """
+
+    def __init__(self, settings: Dict = None):
+        self.settings = settings if settings is not None else dict(DEFAULT_SETTINGS)
+        self._lock = threading.Lock()
+        self._keys = {}
+        self.allowed = 0
+        self.suppressed = 0
+
+    def _setting(self, name: str) -> float:
+        return float(self.settings.get(name, DEFAULT_SETTINGS[name]))
+
+    def _refill(self, state: _KeyState, now: float):
+        refill = self._setting("alert_refill_seconds")
+        burst = self._setting("alert_burst")
+        if refill > 0:
+            state.tokens = min(burst, state.tokens + (now - state.refilled_at) / refill)
+        else:
+            state.tokens = burst
+        state.refilled_at = now
+
+    def _ready(self, state: _KeyState, now: float) -> bool:
+        self._refill(state, now)
+        interval = self._setting("renotify_interval")
+        return (state.tokens >= 1 and
+                (state.notified_at is None or now - state.notified_at >= interval))
+
+    @staticmethod
+    def _take_pending(state: _KeyState) -> Optional[Tuple[int, float]]:
+        if not state.suppressed:
+            return None
+        pending = (state.suppressed, state.suppressed_since)
+        state.suppressed = 0
+        state.suppressed_since = None
+        return pending
+
+    def check(self, alert_type: str, ip: Optional[str], message: str,
+              severity: str, data: Dict,
+              now: float = None) -> Tuple[bool, Optional[Tuple[int, float]]]:
+        """
+        (notify, folded): whether this alert should go out, and if so the
+        (count, since) of earlier repeats it now stands for
+        """
+        if now is None:
+            now = time.time()
+        key = (alert_type, ip)
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                state = self._keys[key] = _KeyState(self._setting("alert_burst"), now)
+
+            if self._ready(state, now):
+                state.tokens -= 1
+                state.notified_at = now
+                self.allowed += 1
+                return True, self._take_pending(state)
+
+            if not state.suppressed:
+                state.suppressed_since = now
+            state.suppressed += 1
+            state.last = (message, severity, data)
+            self.suppressed += 1
+            return False, None
+
+    def due(self, now: float = None) -> List[Tuple[Tuple, Tuple, int, float]]:
+        """
+        Summaries that can go out now: (key, (message, severity, data),
+        count, since) for quiet incidents with suppressed repeats. Also
+        forgets keys that are idle and fully refilled.
+        """
+        if now is None:
+            now = time.time()
+        summaries = []
+        with self._lock:
+            burst = self._setting("alert_burst")
+            for key, state in list(self._keys.items()):
+                if state.suppressed and self._ready(state, now):
+                    state.tokens -= 1
+                    state.notified_at = now
+                    count, since = self._take_pending(state)
+                    summaries.append((key, state.last, count, since))
+                    self.allowed += 1
+                elif not state.suppressed:
+                    self._refill(state, now)
+                    quiet = (state.notified_at is None or
+                             now - state.notified_at >= self._setting("renotify_interval"))
+                    if quiet and state.tokens >= burst:
+                        del self._keys[key]
+        return summaries
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "tracked_incidents": len(self._keys),
+                "pending_repeats": sum(s.suppressed for s in self._keys.values()),
+                "notified": self.allowed,
+                "suppressed": self.suppressed,
+                "settings": {name: self._setting(name) for name in DEFAULT_SETTINGS}
+            }
@@ -2,101 +2,285 @@
 Alert System Module
 Manages alerts, notifications, and thresholds
 """
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime
-from typing import Dict, List, Callable
+import itertools
 import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Callable, Sequence
+
+import numpy as np
+
+from alert_dispatch import AlertDispatcher
+from alert_suppression import AlertSuppressor, DEFAULT_SETTINGS as SUPPRESSION_DEFAULTS
+from email_delivery import EmailDigest, SMTPSession
+
+
+class TickRules:
+    """
+    Threshold rules evaluated for every client of a tick at once
+    
+    A tick comes in as columns (ip, usage, allocated, priority). Usage
+    percentages and every rule mask are computed with array operations,
+    and the sustained-usage counters live in arrays indexed by a slot per
+    IP. Python-level work is only done for clients that trip a rule. The
+    IP-to-slot mapping and the priority ordering are reused while the
+    client list and priorities stay the same; when the list changes, slots
+    of IPs that left are cleared and handed to new ones, so the arrays
+    stay as large as the busiest tick.
+    """
+    
+    SUSTAINED_CHECKS = 5  # consecutive high ticks before alerting
+    
+    def __init__(self, manager: "AlertManager", capacity: int = 64):
+        self.manager = manager
+        self.slots = {}  # ip -> index into the counter arrays
+        self.counts = np.zeros(capacity, dtype=np.int32)
+        self.alerted = np.zeros(capacity, dtype=bool)
+        self._free = []
+        self._next = 0  # slots ever handed out
+        self._ips = None
+        self._index = np.zeros(0, dtype=np.intp)
+        self._priority = None
+        self._order = None
+    
+    def _slot(self, ip: str) -> int:
+        slot = self.slots.get(ip)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._next
+            self._next += 1
+            if slot >= len(self.counts):
+                grow = len(self.counts)
+                self.counts = np.concatenate((self.counts, np.zeros(grow, dtype=np.int32)))
+                self.alerted = np.concatenate((self.alerted, np.zeros(grow, dtype=bool)))
+        self.slots[ip] = slot
+        return slot
+    
+    def remove(self, ip: str) -> bool:
+        """Forget a client's counters; returns True if it was tracked"""
+        slot = self.slots.pop(ip, None)
+        if slot is None:
+            return False
+        self.counts[slot] = 0
+        self.alerted[slot] = False
+        self._free.append(slot)
+        return True
+    
+    def index(self, ips: Sequence[str]) -> np.ndarray:
+        """Counter slots for a column of IPs, reclaiming those of departed IPs"""
+        if ips != self._ips:
+            current = set(ips)
+            for ip in [ip for ip in self.slots if ip not in current]:
+                self.remove(ip)
+            self._ips = list(ips)
+            self._index = np.fromiter(
+                (self._slot(ip) for ip in self._ips), dtype=np.intp, count=len(self._ips)
+            )
+        return self._index
+    
+    def track_sustained(self, index: np.ndarray, percent: np.ndarray) -> np.ndarray:
+        """Advance the sustained-usage counters; mask of clients to alert"""
+        high = percent >= self.manager.thresholds.get("sustained_high_usage", 85)
+        counts = np.where(high, self.counts[index] + 1, 0)
+        fire = high & (counts >= self.SUSTAINED_CHECKS) & ~self.alerted[index]
+        self.counts[index] = counts
+        self.alerted[index] = high & (self.alerted[index] | fire)
+        return fire
+    
+    def priority_order(self, priority: np.ndarray) -> np.ndarray:
+        """Stable sort order of the tick by priority (cached)"""
+        if self._priority is None or not np.array_equal(priority, self._priority):
+            self._priority = priority.copy()
+            self._order = np.argsort(priority, kind="stable")
+        return self._order
+    
+    def evaluate(self, ips: Sequence[str], usage: Sequence[float],
+                 allocated: Sequence[float], priority: Sequence[int],
+                 names: Sequence[str] = None, starvation: bool = True) -> int:
+        """Run every rule over one tick; returns the number of rule hits"""
+        manager = self.manager
+        thresholds = manager.thresholds
+        usage = np.asarray(usage, dtype=np.float64)
+        allocated = np.asarray(allocated, dtype=np.float64)
+        priority = np.asarray(priority, dtype=np.int64)
+        names = names if names is not None else ips
+        
+        rated = np.flatnonzero(allocated > 0)
+        percent = usage[rated] / allocated[rated] * 100
+        
+        limit = percent >= thresholds["bandwidth_limit"]
+        sustained = self.track_sustained(self.index(ips)[rated], percent)
+        critical = percent >= thresholds.get("critical_usage", 95)
+        hits = 0
+        
+        for i in np.flatnonzero(limit):
+            c = rated[i]
+            manager._bandwidth_limit_alert(
+                ips[c], names[c], float(usage[c]), float(allocated[c]), float(percent[i])
+            )
+            hits += 1
+        
+        for i in np.flatnonzero(sustained):
+            c = rated[i]
+            manager._high_usage_alert(
+                ips[c], names[c], float(percent[i]), int(self.counts[self._index[c]])
+            )
+            hits += 1
+        
+        for i in np.flatnonzero(critical):
+            c = rated[i]
+            manager._critical_usage_alert(ips[c], names[c], float(percent[i]))
+            hits += 1
+        
+        if (starvation and thresholds["high_priority_starved"] and len(ips) > 1
+                and (priority <= 2).any() and (priority >= 4).any()):
+            order = self.priority_order(priority)
+            ranked_priority = priority[order]
+            ranked_usage = usage[order]
+            diff = ranked_priority[1:] - ranked_priority[:-1]
+            starved = np.flatnonzero(
+                (diff >= 2) &
+                (ranked_usage[:-1] > 0.5) &
+                (ranked_usage[1:] > ranked_usage[:-1] * 2.0)
+            )
+            for i in starved:
+                high, low = order[i], order[i + 1]
+                manager._starvation_alert(
+                    self._client(ips, usage, allocated, priority, high),
+                    self._client(ips, usage, allocated, priority, low),
+                    int(diff[i])
+                )
+                hits += 1
+        
+        return hits
+    
+    @staticmethod
+    def _client(ips, usage, allocated, priority, c) -> Dict:
+        return {
+            "ip": ips[c],
+            "priority": int(priority[c]),
+            "usage": float(usage[c]),
+            "allocated": float(allocated[c])
+        }
 
 
 class AlertManager:
-    def __init__(self):
-        self.alert_handlers = []
+    def __init__(self, dispatcher: AlertDispatcher = None,
+                 history_size: int = 500):
+        self.dispatcher = dispatcher or AlertDispatcher()
         self.thresholds = {
             "bandwidth_limit": 90,  # Alert at 90% usage
             "new_device": True,
             "high_priority_starved": True,
             "unusual_traffic": True,
             "sustained_high_usage": 85,  # Sustained usage threshold
-            "critical_usage": 95  # Critical usage threshold
+            "critical_usage": 95,  # Critical usage threshold
+            **SUPPRESSION_DEFAULTS
         }
-        self.alert_history = []
-        self.high_usage_tracker = {}  # Track sustained high usage
+        self.suppressor = AlertSuppressor(self.thresholds)
+        self.alert_history = deque(maxlen=history_size)
+        self._history_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.store = None  # AnalyticsDB once persistence is attached
+        self.rules = TickRules(self)  # also holds sustained usage counters
         self.email_config = {
             "enabled": False,
             "smtp_server": "smtp.gmail.com",
             "smtp_port": 587,
             "sender_email": "",
             "sender_password": "",
-            "recipient_email": ""
+            "recipient_email": "",
+            "use_tls": True,
+            "digest_window": 60
         }
+        self.email = None  # EmailDigest once email is configured
     
-    def add_handler(self, handler: Callable):
-        """Add custom alert handler"""
-        self.alert_handlers.append(handler)
+    def add_handler(self, handler: Callable, batch: bool = False):
+        """Add custom alert handler (batch=True: called with a list of alerts)"""
+        self.dispatcher.add_handler(handler, batch)
+    
+    def attach_store(self, store):
+        """
+        Persist alerts to an AnalyticsDB
+        
+        Alerts go into the database's write-behind buffer and are written
+        in batches with its next flush (including the one at close). Ids
+        continue after the highest one already stored so the ring and the
+        table page as one sequence.
+        """
+        self._ids = itertools.count(store.get_last_alert_id() + 1)
+        self.store = store
     
     def configure_email(self, smtp_server: str, smtp_port: int,
-                       sender: str, password: str, recipient: str):
-        """Configure email alerts"""
+                       sender: str, password: str, recipient: str,
+                       use_tls: bool = True, digest_window: float = 60):
+        """Configure email alerts (sent as one digest per window)"""
         self.email_config.update({
             "enabled": True,
             "smtp_server": smtp_server,
             "smtp_port": smtp_port,
             "sender_email": sender,
             "sender_password": password,
-            "recipient_email": recipient
+            "recipient_email": recipient,
+            "use_tls": use_tls,
+            "digest_window": digest_window
         })
+        if self.email is not None:
+            self.email.stop()
+        session = SMTPSession(smtp_server, smtp_port, sender, password, use_tls)
+        self.email = EmailDigest(session, recipient, window=digest_window)
     
     def send_email(self, subject: str, body: str):
-        """Send email alert"""
-        if not self.email_config["enabled"]:
-            return False
-        
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = self.email_config["sender_email"]
-            msg['To'] = self.email_config["recipient_email"]
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP(
-                self.email_config["smtp_server"],
-                self.email_config["smtp_port"]
-            )
-            server.starttls()
-            server.login(
-                self.email_config["sender_email"],
-                self.email_config["sender_password"]
-            )
-            
-            text = msg.as_string()
-            server.sendmail(
-                self.email_config["sender_email"],
-                self.email_config["recipient_email"],
-                text
-            )
-            server.quit()
-            return True
-        except Exception as e:
-            print(f"❌ Failed to send email: {e}")
+        """Send email right away through the pooled session"""
+        if not self.email_config["enabled"] or self.email is None:
             return False
+        return self.email.send(subject, body)
     
     def trigger_alert(self, alert_type: str, message: str,
                      severity: str = "info", data: Dict = None):
-        """Trigger an alert"""
+        """Trigger an alert; repeats of a known incident are only counted"""
+        data = data or {}
+        notify, folded = self.suppressor.check(
+            alert_type, data.get("ip"), message, severity, data
+        )
+        if not notify:
+            return None
+        if folded:
+            count, since = folded
+            message, data = self._summarize(message, data, count + 1, since)
+        return self._emit(alert_type, message, severity, data)
+    
+    def flush_suppressed(self) -> int:
+        """Send summaries for incidents that went quiet with repeats pending"""
+        summaries = self.suppressor.due()
+        for (alert_type, _), (message, severity, data), count, since in summaries:
+            message, data = self._summarize(message, data, count, since)
+            self._emit(alert_type, message, severity, data)
+        return len(summaries)
+    
+    @staticmethod
+    def _summarize(message: str, data: Dict, occurrences: int, since: float):
+        since_text = datetime.fromtimestamp(since).strftime('%H:%M:%S')
+        message = f"{message} ({occurrences} occurrences since {since_text})"
+        return message, {**data, "occurrences": occurrences, "since": since_text}
+    
+    def _emit(self, alert_type: str, message: str, severity: str, data: Dict):
         alert = {
+            "id": next(self._ids),
             "type": alert_type,
             "message": message,
             "severity": severity,
             "timestamp": datetime.now(),
-            "data": data or {}
+            "data": data
         }
         
-        self.alert_history.append(alert)
-        if len(self.alert_history) > 100:
-            self.alert_history = self.alert_history[-100:]
+        with self._history_lock:
+            self.alert_history.append(alert)
+        if self.store is not None:
+            self.store.queue_alert(alert)
         
         emoji = {
             "info": "ℹ️",
@@ -107,43 +291,20 @@ class AlertManager:
         
         print(f"{emoji} [{severity.upper()}] {message}")
         
-        for handler in self.alert_handlers:
-            try:
-                threading.Thread(
-                    target=handler,
-                    args=(alert,),
-                    daemon=True
-                ).start()
-            except Exception as e:
-                print(f"❌ Alert handler error: {e}")
+        self.dispatcher.dispatch(alert)
         
-        if severity in ["warning", "error"] and self.email_config["enabled"]:
-            subject = f"EqualNet Alert: {alert_type}"
-            body = f"""
-EqualNet Network Monitor Alert
-
-Type: {alert_type}
-Severity: {severity.upper()}
-Time: {alert['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
-
-Message:
-{message}
-
-Additional Data:
-{data}
-
----
-EqualNet Bandwidth Management System
-            """.strip()
-            
-            threading.Thread(
-                target=self.send_email,
-                args=(subject, body),
-                daemon=True
-            ).start()
+        if severity in ["warning", "error"] and self.email is not None:
+            self.email.add(alert)
         
         return alert
     
+    def check_tick(self, ips: Sequence[str], usage: Sequence[float],
+                   allocated: Sequence[float], priority: Sequence[int],
+                   names: Sequence[str] = None, starvation: bool = True) -> int:
+        """Check the threshold rules for every client of a tick at once"""
+        return self.rules.evaluate(ips, usage, allocated, priority,
+                                   names, starvation)
+    
     def check_bandwidth_limit(self, used: float, allocated: float,
                              ip: str, client_name: str = None):
         """Check if bandwidth usage exceeds threshold"""
@@ -153,13 +314,17 @@ EqualNet Bandwidth Management System
         usage_percent = (used / allocated) * 100
         
         if usage_percent >= self.thresholds["bandwidth_limit"]:
-            name = client_name or ip
-            self.trigger_alert(
-                "bandwidth_limit",
-                f"Client {name} is using {usage_percent:.1f}% of allocated bandwidth",
-                severity="warning",
-                data={"ip": ip, "used": used, "allocated": allocated}
-            )
+            self._bandwidth_limit_alert(ip, client_name or ip, used, allocated,
+                                        usage_percent)
+    
+    def _bandwidth_limit_alert(self, ip: str, name: str, used: float,
+                               allocated: float, usage_percent: float):
+        self.trigger_alert(
+            "bandwidth_limit",
+            f"Client {name} is using {usage_percent:.1f}% of allocated bandwidth",
+            severity="warning",
+            data={"ip": ip, "used": used, "allocated": allocated}
+        )
     
     def check_new_device(self, ip: str, mac: str, device_info: Dict):
         """Alert when new device connects"""
@@ -196,18 +361,23 @@ EqualNet Bandwidth Management System
             low_usage = low_pri.get("usage", 0)
             
             if high_usage > 0.5 and low_usage > high_usage * 2.0:
-                self.trigger_alert(
-                    "priority_starvation",
-                    f"Low priority P{low_pri['priority']} client {low_pri['ip']} "
-                    f"using 2x more bandwidth than high priority P{high_pri['priority']} "
-                    f"client {high_pri['ip']}",
-                    severity="warning",
-                    data={
-                        "high_priority": high_pri,
-                        "low_priority": low_pri,
-                        "priority_diff": priority_diff
-                    }
-                )
+                self._starvation_alert(high_pri, low_pri, priority_diff)
+    
+    def _starvation_alert(self, high_pri: Dict, low_pri: Dict,
+                          priority_diff: int):
+        self.trigger_alert(
+            "priority_starvation",
+            f"Low priority P{low_pri['priority']} client {low_pri['ip']} "
+            f"using 2x more bandwidth than high priority P{high_pri['priority']} "
+            f"client {high_pri['ip']}",
+            severity="warning",
+            data={
+                "ip": low_pri["ip"],
+                "high_priority": high_pri,
+                "low_priority": low_pri,
+                "priority_diff": priority_diff
+            }
+        )
     
     def check_unusual_traffic(self, current_usage: float,
                              avg_usage: float, ip: str):
@@ -229,36 +399,26 @@ EqualNet Bandwidth Management System
     def check_sustained_high_usage(self, ip: str, usage_percent: float,
                                    client_name: str = None):
         """Check for sustained high bandwidth usage"""
-        threshold = self.thresholds.get("sustained_high_usage", 85)
+        slot = np.array([self.rules._slot(ip)])
+        if self.rules.track_sustained(slot, np.array([usage_percent]))[0]:
+            self._high_usage_alert(ip, client_name or ip, usage_percent,
+                                   int(self.rules.counts[slot[0]]))
+    
+    def _high_usage_alert(self, ip: str, name: str, usage_percent: float,
+                          checks: int):
         critical_threshold = self.thresholds.get("critical_usage", 95)
+        severity = "error" if usage_percent >= critical_threshold else "warning"
         
-        if ip not in self.high_usage_tracker:
-            self.high_usage_tracker[ip] = {"count": 0, "alerted": False}
-        
-        if usage_percent >= threshold:
-            self.high_usage_tracker[ip]["count"] += 1
-            
-            if (self.high_usage_tracker[ip]["count"] >= 5 and 
-                not self.high_usage_tracker[ip]["alerted"]):
-                
-                name = client_name or ip
-                severity = "error" if usage_percent >= critical_threshold else "warning"
-                
-                self.trigger_alert(
-                    "high_usage",
-                    f"Sustained high usage from {name}: {usage_percent:.1f}% for extended period",
-                    severity=severity,
-                    data={
-                        "ip": ip,
-                        "usage_percent": usage_percent,
-                        "duration_checks": self.high_usage_tracker[ip]["count"]
-                    }
-                )
-                self.high_usage_tracker[ip]["alerted"] = True
-        else:
-            if ip in self.high_usage_tracker:
-                self.high_usage_tracker[ip]["count"] = 0
-                self.high_usage_tracker[ip]["alerted"] = False
+        self.trigger_alert(
+            "high_usage",
+            f"Sustained high usage from {name}: {usage_percent:.1f}% for extended period",
+            severity=severity,
+            data={
+                "ip": ip,
+                "usage_percent": usage_percent,
+                "duration_checks": checks
+            }
+        )
     
     def check_critical_usage(self, ip: str, usage_percent: float,
                             client_name: str = None):
@@ -266,23 +426,23 @@ EqualNet Bandwidth Management System
         critical_threshold = self.thresholds.get("critical_usage", 95)
         
         if usage_percent >= critical_threshold:
-            name = client_name or ip
-            self.trigger_alert(
-                "critical_usage",
-                f"CRITICAL: {name} is using {usage_percent:.1f}% of allocated bandwidth!",
-                severity="error",
-                data={"ip": ip, "usage_percent": usage_percent}
-            )
+            self._critical_usage_alert(ip, client_name or ip, usage_percent)
+    
+    def _critical_usage_alert(self, ip: str, name: str, usage_percent: float):
+        self.trigger_alert(
+            "critical_usage",
+            f"CRITICAL: {name} is using {usage_percent:.1f}% of allocated bandwidth!",
+            severity="error",
+            data={"ip": ip, "usage_percent": usage_percent}
+        )
     
     def get_high_usage_statistics(self) -> Dict:
         """Get statistics about high usage tracking"""
-        active_high_usage = sum(
-            1 for tracker in self.high_usage_tracker.values()
-            if tracker["count"] > 0
-        )
+        tracked = len(self.rules.slots)
+        active_high_usage = int(np.count_nonzero(self.rules.counts))
         
         return {
-            "tracked_clients": len(self.high_usage_tracker),
+            "tracked_clients": tracked,
             "active_high_usage": active_high_usage,
             "thresholds": {
                 "sustained": self.thresholds.get("sustained_high_usage", 85),
@@ -292,11 +452,54 @@ EqualNet Bandwidth Management System
     
     def get_recent_alerts(self, count: int = 20) -> List[Dict]:
         """Get recent alerts"""
-        return self.alert_history[-count:]
+        with self._history_lock:
+            alerts = list(self.alert_history)
+        return alerts[-count:]
+    
+    def get_alert_page(self, limit: int = 50, before: int = None) -> Dict:
+        """
+        Alerts with id below `before`, newest first
+        
+        Served from the in-memory ring while it reaches back far enough,
+        then from the alerts table. `next_before` is the cursor for the
+        following page (None on the last one).
+        """
+        with self._history_lock:
+            recent = list(self.alert_history)
+        
+        page = [
+            alert for alert in reversed(recent)
+            if before is None or alert["id"] < before
+        ][:limit]
+        
+        if len(page) < limit and self.store is not None:
+            older_than = page[-1]["id"] if page else before
+            rows = self.store.get_alerts_before(older_than, limit - len(page))
+            page.extend(self._from_row(row) for row in rows)
+        
+        return {
+            "data": page,
+            "next_before": page[-1]["id"] if len(page) == limit else None
+        }
+    
+    @staticmethod
+    def _from_row(row: Dict) -> Dict:
+        """Stored alert row in the shape of an in-memory alert"""
+        stored = datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S")
+        local = stored.replace(tzinfo=timezone.utc).astimezone()
+        return {
+            "id": row["id"],
+            "type": row["alert_type"],
+            "message": row["message"],
+            "severity": row["severity"],
+            "timestamp": local.replace(tzinfo=None),
+            "data": {"ip": row["ip_address"]} if row["ip_address"] else {}
+        }
     
     def clear_alerts(self):
         """Clear alert history"""
-        self.alert_history = []
+        with self._history_lock:
+            self.alert_history.clear()
     
     def set_threshold(self, key: str, value):
         """Update alert threshold"""
@@ -305,6 +508,20 @@ EqualNet Bandwidth Management System
     def get_thresholds(self) -> Dict:
         """Get current thresholds"""
         return self.thresholds.copy()
+    
+    def get_suppression_stats(self) -> Dict:
+        """Get alert deduplication statistics"""
+        return self.suppressor.get_stats()
+    
+    def get_dispatch_stats(self) -> Dict:
+        """Get handler queue depth, drop and latency metrics"""
+        return self.dispatcher.get_stats()
+    
+    def get_email_stats(self) -> Dict:
+        """Get email digest delivery statistics"""
+        if self.email is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.email.get_stats()}
 
 
 alert_manager = AlertManager()
@@ -332,4 +549,6 @@ if __name__ == "__main__":
     
     manager.check_bandwidth_limit(95, 100, "192.168.1.100", "Test Device")
     
+    manager.dispatcher.join()
     print(f"\n📊 Recent alerts: {len(manager.get_recent_alerts())}")
+    print(f"📬 Dispatch: {manager.get_dispatch_stats()}")
@@ -1,16 +1,28 @@
 from flask import Flask, jsonify, request, send_from_directory, Response
 from flask_cors import CORS
+import atexit
 import threading
 import time
 import csv
 import io
-from datetime import datetime, timedelta
+import zlib
+from datetime import datetime
 from monitor import get_connected_devices
 from load_balancer import LoadBalancer
-from utils import get_bandwidth_usage
+from utils import TrafficSampler
 from device_recognizer import DeviceRecognizer
-from analytics_db import AnalyticsDB
+from analytics_db import (
+    AnalyticsDB, utc_since, ALERTS_EXPORT_QUERY, MAX_PAGE_ROWS, WINDOW_END,
+    BANDWIDTH_HISTORY_QUERY, CLIENT_EXPORT_QUERY, HISTORY_RANGE_QUERY
+)
+from downsampling import METHODS as DOWNSAMPLING_METHODS
+from columnar import COLUMNAR_TABLES, select_columns, write_columnar
+from traffic_sources import ClientRate, ClientRateTracker, get_default_source
 from alert_system import AlertManager
+from event_stream import Broadcaster
+from history_rings import TrafficHistory, parse_range
+from snapshot import Snapshot
+from state_store import StateStore
 from qos_manager import QoSManager
 from network_scanner import get_all_network_devices
 from router_controller import RouterController
@@ -23,8 +35,21 @@ CORS(app)
 
 device_recognizer = DeviceRecognizer()
 analytics_db = AnalyticsDB()
+atexit.register(analytics_db.close)
 alert_manager = AlertManager()
+alert_manager.attach_store(analytics_db)
 qos_manager = QoSManager()
+traffic_sampler = TrafficSampler().start()
+broadcaster = Broadcaster()
+traffic_history = TrafficHistory()
+
+traffic_source = get_default_source("192.168.137.0/24" if HOTSPOT_MODE else None)
+rate_tracker = ClientRateTracker(traffic_source) if traffic_source else None
+if rate_tracker:
+    atexit.register(traffic_source.close)
+    print(f"📡 Per-client usage from {traffic_source.name} counters")
+else:
+    print("⚠️ No per-client traffic source - allocating by priority only")
 
 if HOTSPOT_MODE:
     bandwidth_controller = WindowsHotspotController()
@@ -45,7 +70,7 @@ try:
 except Exception as e:
     print(f"⚠️ Could not load device names: {e}")
 
-STATE = {
+STATE = StateStore({
     "total_bandwidth": 100,
     "max_priority": 5,
     "min_bandwidth_percent": 10,
@@ -54,23 +79,107 @@ STATE = {
     "allocations": {},
     "usage": {},
     "network_stats": {"sent": 0, "recv": 0},
-    "history": {
-        "time": [],
-        "upload": [],
-        "download": []
-    },
     "device_info": {},
-    "known_devices": set(),
+    "known_devices": frozenset(),
     "qos_enabled": True,
     "app_types": {},
     "priority_adjustments": {}
-}
+})
+
+lb = LoadBalancer(
+    STATE["total_bandwidth"],
+    max_priority=STATE["max_priority"],
+    min_bandwidth_percent=STATE["min_bandwidth_percent"]
+)
+
+
+def build_status(state):
+    total_alloc = round(
+        sum(state["allocations"].values()), 2
+    ) if state["allocations"] else 0
+    
+    return {
+        "total_bandwidth": state["total_bandwidth"],
+        "max_priority": state["max_priority"],
+        "min_bandwidth_percent": state["min_bandwidth_percent"],
+        "total_clients": len(state["clients"]),
+        "network_stats": state["network_stats"],
+        "total_allocated": total_alloc
+    }
 
-lb = None
+
+def build_clients(state):
+    clients_data = []
+    for ip in state["clients"]:
+        usage = state["usage"].get(ip, 0)
+        total_bw = state["total_bandwidth"]
+        usage_pct = round((usage / total_bw) * 100, 1)
+        device_info = state["device_info"].get(ip, {})
+        
+        clients_data.append({
+            "ip": ip,
+            "priority": state["priorities"].get(ip, 1),
+            "usage": round(usage, 2),
+            "allocated": round(state["allocations"].get(ip, 0), 2),
+            "usage_percent": usage_pct,
+            "mac": device_info.get("mac", "Unknown"),
+            "vendor": device_info.get("vendor", "Unknown"),
+            "device_type": device_info.get("device_type", "unknown"),
+            "icon": device_info.get("icon", "❓"),
+            "friendly_name": device_info.get("friendly_name", ip),
+            "app_type": state["app_types"].get(ip, "browsing")
+        })
+    return clients_data
+
+
+SNAPSHOT_BODIES = ("status", "clients", "history")
+
+
+def publish_snapshot(version=0):
+    """Encode this tick's dashboard view once for REST and SSE readers"""
+    global SNAPSHOT
+    state = STATE.snapshot()
+    snapshot = Snapshot(version, {
+        "status": build_status(state),
+        "clients": build_clients(state),
+        "history": traffic_history.recent(30)
+    })
+    SNAPSHOT = snapshot
+    broadcaster.publish(snapshot.combined(SNAPSHOT_BODIES), event="snapshot")
+
+
+def snapshot_response(name):
+    """Serve a pre-encoded body, honouring If-None-Match and gzip"""
+    body = SNAPSHOT.get(name)
+    use_gzip = (body.gzipped is not None and
+                'gzip' in request.accept_encodings)
+    etag = body.etag + ('-gz' if use_gzip else '')
+    
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(body.gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(body.data, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def seed_priorities(clients):
+    """Command: default priorities by discovery order, once"""
+    def command(draft):
+        if not draft["priorities"]:
+            draft["priorities"] = {
+                ip: min(i + 1, draft["max_priority"])
+                for i, ip in enumerate(clients)
+            }
+    return command
 
 
 def update_loop():
-    global lb, STATE
     iteration = 0
     last_full_scan = 0
     db_names_cache = {}
@@ -97,17 +206,18 @@ def update_loop():
             if HOTSPOT_MODE:
                 clients = [ip for ip in clients if ip.startswith('192.168.137.')]
             
+            devices = device_recognizer.get_devices_info(clients)
+            known_devices = STATE["known_devices"]
+            new_devices = []
             for ip in clients:
-                device_info = device_recognizer.get_device_info(ip)
+                device_info = devices[ip]
                 
                 if ip in db_names_cache:
                     device_info['friendly_name'] = db_names_cache[ip]
                     device_recognizer.set_custom_name(ip, db_names_cache[ip])
                 
-                STATE["device_info"][ip] = device_info
-                
-                if ip not in STATE["known_devices"]:
-                    STATE["known_devices"].add(ip)
+                if ip not in known_devices:
+                    new_devices.append(ip)
                     alert_manager.check_new_device(
                         ip,
                         device_info["mac"],
@@ -121,66 +231,105 @@ def update_loop():
                         device_info["friendly_name"]
                     )
             
-            STATE["clients"] = clients[:20]
+            STATE.set(
+                known_devices=known_devices.union(new_devices),
+                clients=clients[:20]
+            )
+            STATE.merge(device_info={ip: devices[ip] for ip in clients})
+            
+            client_rates = {}
+            if rate_tracker:
+                try:
+                    client_rates = rate_tracker.sample(clients)
+                except Exception as e:
+                    print(f"⚠️ Could not read per-client traffic: {e}")
             
-            if not STATE["priorities"]:
-                for i, ip in enumerate(clients):
-                    priority = min(i + 1, STATE["max_priority"])
-                    STATE["priorities"][ip] = priority
+            STATE.apply(seed_priorities(clients))
+            state = STATE.snapshot()
             
-            if STATE["qos_enabled"] and iteration % 5 == 0:
+            if state["qos_enabled"] and iteration % 5 == 0:
+                current_usage = lb.usage
                 client_data = []
                 for ip in clients:
+                    if rate_tracker:
+                        upload, download = client_rates.get(ip, ClientRate(0.0, 0.0))
+                    else:
+                        upload = state["network_stats"]["sent"] / len(clients)
+                        download = state["network_stats"]["recv"] / len(clients)
                     client_data.append({
                         "ip": ip,
-                        "usage": lb.usage.get(ip, 0) if lb else 0,
-                        "upload": STATE["network_stats"]["sent"] / len(clients),
-                        "download": STATE["network_stats"]["recv"] / len(clients)
+                        "usage": current_usage.get(ip, 0),
+                        "upload": upload,
+                        "download": download
                     })
                 
                 optimized = qos_manager.optimize_priorities(client_data)
+                priorities, app_types, adjustments = {}, {}, {}
                 for ip, info in optimized.items():
-                    old_priority = STATE["priorities"].get(ip, 4)
+                    old_priority = state["priorities"].get(ip, 4)
                     new_priority = info["priority"]
                     
                     if old_priority != new_priority:
-                        STATE["priorities"][ip] = new_priority
-                        STATE["app_types"][ip] = info["app_type"]
-                        STATE["priority_adjustments"][ip] = {
+                        priorities[ip] = new_priority
+                        lb.update_priority(ip, new_priority)
+                        app_types[ip] = info["app_type"]
+                        adjustments[ip] = {
                             "old": old_priority,
                             "new": new_priority,
                             "reason": info["app_type"]
                         }
                         print(f"🎯 [QoS] {ip}: Priority {old_priority}→{new_priority} "
                               f"({info['app_type']})")
+                
+                if priorities:
+                    STATE.merge(
+                        priorities=priorities,
+                        app_types=app_types,
+                        priority_adjustments=adjustments
+                    )
+                    state = STATE.snapshot()
             
-            lb = LoadBalancer(
-                STATE["total_bandwidth"],
-                max_priority=STATE["max_priority"],
-                min_bandwidth_percent=STATE["min_bandwidth_percent"]
-            )
-            lb.register_clients(clients, STATE["priorities"])
+            if lb.configure(
+                state["total_bandwidth"],
+                max_priority=state["max_priority"],
+                min_bandwidth_percent=state["min_bandwidth_percent"]
+            ):
+                for ip, priority in state["priorities"].items():
+                    lb.update_priority(ip, priority)
+            
+            lb.sync_clients(clients, state["priorities"])
+            if rate_tracker:
+                for ip in clients:
+                    lb.update_usage(ip, client_rates.get(ip, ClientRate(0.0, 0.0)).mbps)
             
             allocations = lb.rebalance_load()
-            STATE["allocations"] = allocations
-            STATE["usage"] = lb.usage
+            usage_now = lb.usage
             
-            sent, recv = get_bandwidth_usage()
-            STATE["network_stats"] = {
-                "sent": round(sent, 2),
-                "recv": round(recv, 2)
-            }
+            sent, recv = traffic_sampler.rate(window=2)
+            STATE.set(
+                allocations=allocations,
+                usage=usage_now,
+                network_stats={
+                    "sent": round(sent, 2),
+                    "recv": round(recv, 2)
+                }
+            )
             
-            analytics_db.log_bandwidth(sent, recv, len(clients))
+            analytics_db.queue_bandwidth(sent, recv, len(clients))
             
-            client_list = []
+            ips, usages, allocated_column, priorities, names = [], [], [], [], []
             for ip in clients:
-                usage = STATE["usage"].get(ip, 0)
-                allocated = STATE["allocations"].get(ip, 0)
-                priority = STATE["priorities"].get(ip, 1)
-                device_info = STATE["device_info"].get(ip, {})
+                usage = usage_now.get(ip, 0)
+                allocated = allocations.get(ip, 0)
+                priority = state["priorities"].get(ip, 1)
+                device_info = devices[ip]
+                if rate_tracker:
+                    upload, download = client_rates.get(ip, ClientRate(0.0, 0.0))
+                else:
+                    upload = sent / len(clients) if clients else 0
+                    download = recv / len(clients) if clients else 0
                 
-                analytics_db.log_client_usage({
+                analytics_db.queue_client_usage({
                     "ip": ip,
                     "mac": device_info.get("mac", ""),
                     "vendor": device_info.get("vendor", ""),
@@ -188,63 +337,28 @@ def update_loop():
                     "priority": priority,
                     "allocated": allocated,
                     "usage": usage,
-                    "upload": sent / len(clients) if clients else 0,
-                    "download": recv / len(clients) if clients else 0
+                    "upload": upload,
+                    "download": download
                 })
                 
-                if allocated > 0:
-                    usage_percent = (usage / allocated) * 100
-                    device_name = device_info.get("friendly_name", ip)
-                    
-                    alert_manager.check_bandwidth_limit(
-                        usage,
-                        allocated,
-                        ip,
-                        device_name
-                    )
-                    
-                    alert_manager.check_sustained_high_usage(
-                        ip,
-                        usage_percent,
-                        device_name
-                    )
-                    
-                    if usage_percent >= 95:
-                        alert_manager.check_critical_usage(
-                            ip,
-                            usage_percent,
-                            device_name
-                        )
-                
-                client_list.append({
-                    "ip": ip,
-                    "priority": priority,
-                    "usage": usage,
-                    "allocated": allocated
-                })
+                ips.append(ip)
+                usages.append(usage)
+                allocated_column.append(allocated)
+                priorities.append(priority)
+                names.append(device_info.get("friendly_name", ip))
             
-            if len(client_list) > 1 and iteration > 30:
-                high_priority = [c for c in client_list if c['priority'] <= 2]
-                low_priority = [c for c in client_list if c['priority'] >= 4]
-                
-                if high_priority and low_priority:
-                    alert_manager.check_priority_starvation(client_list)
+            alert_manager.check_tick(
+                ips, usages, allocated_column, priorities, names,
+                starvation=iteration > 30
+            )
+            
+            alert_manager.flush_suppressed()
+            analytics_db.end_tick()
             
             iteration += 1
-            STATE["history"]["time"].append(iteration)
-            STATE["history"]["upload"].append(sent)
-            STATE["history"]["download"].append(recv)
+            traffic_history.add(sent, recv)
             
-            if len(STATE["history"]["time"]) > 30:
-                STATE["history"]["time"] = (
-                    STATE["history"]["time"][-30:]
-                )
-                STATE["history"]["upload"] = (
-                    STATE["history"]["upload"][-30:]
-                )
-                STATE["history"]["download"] = (
-                    STATE["history"]["download"][-30:]
-                )
+            publish_snapshot(iteration)
             
             msg = (
                 f"✓ Updated: {len(clients)} clients, "
@@ -259,6 +373,9 @@ def update_loop():
             time.sleep(5)
 
 
+SNAPSHOT = None
+publish_snapshot()
+
 thread = threading.Thread(target=update_loop, daemon=True)
 thread.start()
 
@@ -275,68 +392,61 @@ def serve_static(filename):
 
 @app.route('/api/status')
 def get_status():
-    total_alloc = round(
-        sum(STATE["allocations"].values()), 2
-    ) if STATE["allocations"] else 0
-    
-    return jsonify({
-        "total_bandwidth": STATE["total_bandwidth"],
-        "max_priority": STATE["max_priority"],
-        "min_bandwidth_percent": STATE["min_bandwidth_percent"],
-        "total_clients": len(STATE["clients"]),
-        "network_stats": STATE["network_stats"],
-        "total_allocated": total_alloc
-    })
+    return snapshot_response("status")
 
 
 @app.route('/api/clients')
 def get_clients():
-    clients_data = []
-    for ip in STATE["clients"]:
-        usage = STATE["usage"].get(ip, 0)
-        total_bw = STATE["total_bandwidth"]
-        usage_pct = round((usage / total_bw) * 100, 1)
-        device_info = STATE["device_info"].get(ip, {})
-        
-        clients_data.append({
-            "ip": ip,
-            "priority": STATE["priorities"].get(ip, 1),
-            "usage": round(usage, 2),
-            "allocated": round(STATE["allocations"].get(ip, 0), 2),
-            "usage_percent": usage_pct,
-            "mac": device_info.get("mac", "Unknown"),
-            "vendor": device_info.get("vendor", "Unknown"),
-            "device_type": device_info.get("device_type", "unknown"),
-            "icon": device_info.get("icon", "❓"),
-            "friendly_name": device_info.get("friendly_name", ip),
-            "app_type": STATE["app_types"].get(ip, "browsing")
-        })
-    return jsonify(clients_data)
+    return snapshot_response("clients")
 
 
 @app.route('/api/history')
 def get_history():
-    return jsonify(STATE["history"])
+    """Recent traffic; ?range=15m|1h|24h|7d serves the best-fitting ring"""
+    if 'range' not in request.args:
+        return snapshot_response("history")
+    
+    seconds = parse_range(request.args['range'])
+    if not seconds:
+        return jsonify({"success": False, "error": "Invalid range"}), 400
+    return jsonify(traffic_history.series(seconds))
+
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events feed of one dashboard snapshot per tick"""
+    response = Response(broadcaster.stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/stream/stats')
+def stream_stats():
+    """Get SSE subscriber and drop counts"""
+    return jsonify(broadcaster.get_stats())
 
 
 @app.route('/api/config', methods=['GET', 'POST'])
 def update_config():
     if request.method == 'GET':
+        state = STATE.snapshot()
         return jsonify({
-            "total_bandwidth": STATE["total_bandwidth"],
-            "max_priority": STATE["max_priority"],
-            "min_bandwidth_percent": STATE["min_bandwidth_percent"]
+            "total_bandwidth": state["total_bandwidth"],
+            "max_priority": state["max_priority"],
+            "min_bandwidth_percent": state["min_bandwidth_percent"]
         })
     
-    data = request.json
-    if data and "total_bandwidth" in data:
-        STATE["total_bandwidth"] = int(data["total_bandwidth"])
-    if data and "max_priority" in data:
-        STATE["max_priority"] = int(data["max_priority"])
-    if data and "min_bandwidth_percent" in data:
-        STATE["min_bandwidth_percent"] = int(data["min_bandwidth_percent"])
-    if data and "priorities" in data:
-        STATE["priorities"].update(data["priorities"])
+    data = request.json or {}
+    STATE.set(**{
+        key: int(data[key])
+        for key in ("total_bandwidth", "max_priority", "min_bandwidth_percent")
+        if key in data
+    })
+    if "priorities" in data:
+        STATE.merge(priorities=data["priorities"])
+        for ip, priority in data["priorities"].items():
+            lb.update_priority(ip, priority)
     return jsonify({"success": True})
 
 
@@ -349,7 +459,8 @@ def update_priority(ip):
             priority = 1
         if priority > STATE["max_priority"]:
             priority = STATE["max_priority"]
-        STATE["priorities"][ip] = priority
+        STATE.merge(priorities={ip: priority})
+        lb.update_priority(ip, priority)
         return jsonify({"success": True, "ip": ip, "priority": priority})
     return jsonify({"success": False})
 
@@ -363,29 +474,57 @@ def device_info(ip):
         data = request.json
         if data and "friendly_name" in data:
             device_recognizer.set_custom_name(ip, data["friendly_name"])
-            STATE["device_info"][ip] = device_recognizer.get_device_info(ip)
+            STATE.merge(device_info={ip: device_recognizer.get_device_info(ip)})
             return jsonify({"success": True})
         return jsonify({"success": False})
 
 
 @app.route('/api/analytics/bandwidth/<int:hours>')
 def analytics_bandwidth(hours):
-    """Get bandwidth history"""
-    data = analytics_db.get_bandwidth_history(hours)
+    """
+    Get bandwidth history
+    
+    ?points=N returns at most N samples picked by LTTB (or ?method=minmax);
+    ?limit=N pages through raw rows, passing back ?before=<next_before>.
+    """
+    points = request.args.get('points', type=int)
+    limit = request.args.get('limit', type=int)
+    if points:
+        method = request.args.get('method', 'lttb')
+        if method not in DOWNSAMPLING_METHODS:
+            return jsonify({
+                "success": False,
+                "error": f"Unknown method '{method}'"
+            }), 400
+        data = analytics_db.get_bandwidth_downsampled(hours, points, method)
+    elif limit:
+        try:
+            data = analytics_db.get_bandwidth_page(
+                hours, limit, request.args.get('before')
+            )
+        except ValueError:
+            return jsonify({"success": False, "error": "Invalid cursor"}), 400
+    else:
+        data = analytics_db.get_bandwidth_history(hours)
     return jsonify(data)
 
 
 @app.route('/api/analytics/client/<ip>/<int:hours>')
 def analytics_client(ip, hours):
     """Get client usage summary"""
-    data = analytics_db.get_client_usage_summary(ip, hours)
+    data = analytics_db.get_client_usage_summary(
+        ip, hours, resolution=request.args.get('resolution')
+    )
     return jsonify(data)
 
 
 @app.route('/api/analytics/top/<int:limit>')
 def analytics_top(limit):
     """Get top bandwidth consumers"""
-    data = analytics_db.get_top_clients(limit, 24)
+    hours = request.args.get('hours', 24, type=int)
+    data = analytics_db.get_top_clients(
+        limit, hours, resolution=request.args.get('resolution')
+    )
     return jsonify(data)
 
 
@@ -399,17 +538,64 @@ def analytics_hourly(hours):
 @app.route('/api/analytics/report/<int:days>')
 def analytics_report(days):
     """Get daily report"""
-    data = analytics_db.get_daily_report(days)
+    data = analytics_db.get_daily_report(
+        days, resolution=request.args.get('resolution')
+    )
     return jsonify(data)
 
 
+@app.route('/api/analytics/ingest')
+def analytics_ingest():
+    """Get write-behind ingest queue statistics"""
+    return jsonify(analytics_db.get_ingest_stats())
+
+
+@app.route('/api/devices/cache')
+def device_cache_stats():
+    """Get device identity cache statistics"""
+    return jsonify(device_recognizer.get_cache_stats())
+
+
+def alert_json(alert):
+    """Copy of an alert with its timestamp formatted for JSON"""
+    return {**alert, "timestamp": alert["timestamp"].strftime("%Y-%m-%d %H:%M:%S")}
+
+
 @app.route('/api/alerts')
 def get_alerts():
-    """Get recent alerts"""
-    alerts = alert_manager.get_recent_alerts(50)
-    for alert in alerts:
-        alert["timestamp"] = alert["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-    return jsonify(alerts)
+    """
+    Get recent alerts
+    
+    ?limit=N pages through the whole alert history, newest first, passing
+    back ?before=<next_before>.
+    """
+    limit = request.args.get('limit', type=int)
+    if not limit:
+        return jsonify([alert_json(a) for a in alert_manager.get_recent_alerts(50)])
+    
+    page = alert_manager.get_alert_page(
+        max(1, min(limit, MAX_PAGE_ROWS)), request.args.get('before', type=int)
+    )
+    page["data"] = [alert_json(a) for a in page["data"]]
+    return jsonify(page)
+
+
+@app.route('/api/alerts/dispatch')
+def alerts_dispatch_stats():
+    """Get alert handler queue statistics"""
+    return jsonify(alert_manager.get_dispatch_stats())
+
+
+@app.route('/api/alerts/suppression')
+def alerts_suppression_stats():
+    """Get alert deduplication statistics"""
+    return jsonify(alert_manager.get_suppression_stats())
+
+
+@app.route('/api/alerts/email')
+def alerts_email_stats():
+    """Get email digest delivery statistics"""
+    return jsonify(alert_manager.get_email_stats())
 
 
 @app.route('/api/alerts/config', methods=['GET', 'POST'])
@@ -437,10 +623,11 @@ def get_all_devices():
 def qos_status():
     """Get QoS status and statistics"""
     stats = qos_manager.get_statistics()
+    state = STATE.snapshot()
     return jsonify({
-        "enabled": STATE["qos_enabled"],
-        "app_types": STATE["app_types"],
-        "priority_adjustments": STATE["priority_adjustments"],
+        "enabled": state["qos_enabled"],
+        "app_types": state["app_types"],
+        "priority_adjustments": state["priority_adjustments"],
         "statistics": stats
     })
 
@@ -448,12 +635,16 @@ def qos_status():
 @app.route('/api/qos/toggle', methods=['POST'])
 def qos_toggle():
     """Enable/disable QoS"""
-    STATE["qos_enabled"] = not STATE["qos_enabled"]
-    status = "enabled" if STATE["qos_enabled"] else "disabled"
+    def toggle(draft):
+        draft["qos_enabled"] = not draft["qos_enabled"]
+        return draft["qos_enabled"]
+    
+    enabled = STATE.apply(toggle)
+    status = "enabled" if enabled else "disabled"
     print(f"🎯 [QoS] Auto-adjustment {status}")
     return jsonify({
         "success": True,
-        "enabled": STATE["qos_enabled"],
+        "enabled": enabled,
         "message": f"QoS {status}"
     })
 
@@ -490,16 +681,8 @@ def device_label(ip):
                 custom_label
             )
             
-            if ip in STATE["device_info"]:
-                STATE["device_info"][ip]["friendly_name"] = custom_label
-            else:
-                STATE["device_info"][ip] = {
-                    "friendly_name": custom_label,
-                    "ip": ip
-                }
-            
             updated_info = device_recognizer.get_device_info(ip)
-            STATE["device_info"][ip] = updated_info
+            STATE.merge(device_info={ip: updated_info})
             
             return jsonify({
                 "success": True,
@@ -523,9 +706,7 @@ def get_high_usage_alerts():
         alert for alert in all_alerts
         if alert["type"] in ["bandwidth_limit", "unusual_traffic"]
     ]
-    for alert in high_usage_alerts:
-        alert["timestamp"] = alert["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-    return jsonify(high_usage_alerts)
+    return jsonify([alert_json(a) for a in high_usage_alerts])
 
 
 @app.route('/api/router/info')
@@ -539,18 +720,19 @@ def router_info():
 @app.route('/api/router/apply_limits', methods=['POST'])
 def apply_limits_to_router():
     """Apply calculated bandwidth limits to network controller"""
+    state = STATE.snapshot()
     try:
         results = bandwidth_controller.apply_all_limits(
-            STATE["allocations"], STATE.get("priorities", {})
+            state["allocations"], state.get("priorities", {})
         )
         success_count = sum(1 for v in results.values() if v)
         
         return jsonify({
             "success": True,
             "applied": success_count,
-            "total": len(STATE["allocations"]),
+            "total": len(state["allocations"]),
             "results": results,
-            "message": f"Applied limits to {success_count}/{len(STATE['allocations'])} devices"
+            "message": f"Applied limits to {success_count}/{len(state['allocations'])} devices"
         })
     except Exception as e:
         return jsonify({
@@ -589,7 +771,8 @@ def apply_priority_to_router(ip):
     data = request.get_json()
     priority = data.get('priority', 4)
     
-    STATE["priorities"][ip] = priority
+    STATE.merge(priorities={ip: priority})
+    lb.update_priority(ip, priority)
     
     try:
         success = bandwidth_controller.set_priority(ip, priority)
@@ -638,161 +821,149 @@ def set_usage_threshold():
     return jsonify({"success": False, "error": "Invalid threshold"})
 
 
+def csv_chunks(row_chunks):
+    """Encode an iterable of row lists as CSV, one bytes chunk per list"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for rows in row_chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def with_header(row_chunks):
+    """Prefix the first chunk of sqlite rows with its column names"""
+    first = True
+    for rows in row_chunks:
+        if first:
+            rows = [rows[0].keys()] + rows
+            first = False
+        yield rows
+
+
+def gzip_chunks(chunks):
+    """Compress a byte stream on the fly into one gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(row_chunks, name):
+    """Streaming CSV download; `?gzip=1` sends it as a .csv.gz file"""
+    filename = f'{name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    body = csv_chunks(row_chunks)
+    mimetype = 'text/csv'
+    if request.args.get('gzip', 0, type=int):
+        body = gzip_chunks(body)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
 @app.route('/api/export/csv/bandwidth')
 def export_bandwidth_csv():
     """Export bandwidth history to CSV"""
     hours = request.args.get('hours', 24, type=int)
-    data = analytics_db.get_bandwidth_history(hours)
-    
-    output = io.StringIO()
-    if data:
-        writer = csv.DictWriter(output, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-    
-    response = Response(output.getvalue(), mimetype='text/csv')
-    filename = f'bandwidth_history_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    return response
+    rows = analytics_db.iter_query(BANDWIDTH_HISTORY_QUERY, (utc_since(hours=hours),))
+    return csv_response(with_header(rows), 'bandwidth_history')
 
 
 @app.route('/api/export/csv/clients')
 def export_clients_csv():
     """Export client usage data to CSV"""
     hours = request.args.get('hours', 24, type=int)
-    
-    since = datetime.now() - timedelta(hours=hours)
-    conn = analytics_db.get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT
-            ip_address,
-            mac_address,
-            vendor,
-            device_type,
-            AVG(priority) as avg_priority,
-            AVG(allocated_bandwidth) as avg_allocated,
-            AVG(used_bandwidth) as avg_used,
-            AVG(upload_speed) as avg_upload,
-            AVG(download_speed) as avg_download,
-            MAX(used_bandwidth) as peak_usage,
-            COUNT(*) as data_points
-        FROM client_history
-        WHERE timestamp >= ?
-        GROUP BY ip_address
-        ORDER BY avg_used DESC
-    ''', (since,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    output = io.StringIO()
-    if rows:
-        fieldnames = ['ip_address', 'mac_address', 'vendor', 'device_type',
-                     'avg_priority', 'avg_allocated', 'avg_used', 'avg_upload',
-                     'avg_download', 'peak_usage', 'data_points']
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(dict(row))
-    
-    response = Response(output.getvalue(), mimetype='text/csv')
-    filename = f'client_usage_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    return response
+    rows = analytics_db.iter_query(CLIENT_EXPORT_QUERY, (utc_since(hours=hours),))
+    return csv_response(with_header(rows), 'client_usage')
 
 
 @app.route('/api/export/csv/alerts')
 def export_alerts_csv():
     """Export alerts history to CSV"""
     limit = request.args.get('limit', 1000, type=int)
+    rows = analytics_db.iter_query(ALERTS_EXPORT_QUERY, (limit,))
+    return csv_response(with_header(rows), 'alerts')
+
+
+@app.route('/api/export/columnar/<table>')
+def export_columnar(table):
+    """Export a time range of raw history as a compressed columnar file"""
+    if table not in COLUMNAR_TABLES:
+        return jsonify({
+            "success": False,
+            "error": f"Unknown table '{table}'",
+            "tables": list(COLUMNAR_TABLES)
+        }), 404
     
-    conn = analytics_db.get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT
-            timestamp,
-            alert_type,
-            ip_address,
-            message,
-            severity
-        FROM alerts
-        ORDER BY timestamp DESC
-        LIMIT ?
-    ''', (limit,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    output = io.StringIO()
-    if rows:
-        fieldnames = ['timestamp', 'alert_type', 'ip_address', 'message', 'severity']
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(dict(row))
+    hours = request.args.get('hours', 24, type=int)
+    start = request.args.get('start') or utc_since(hours=hours)
+    end = request.args.get('end') or WINDOW_END
+    query = HISTORY_RANGE_QUERY.format(columns=select_columns(table), table=table)
     
-    response = Response(output.getvalue(), mimetype='text/csv')
-    filename = f'alerts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    data = write_columnar(table, analytics_db.iter_query(query, (start, end)))
+    response = Response(data, mimetype='application/octet-stream')
+    filename = f'{table}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.eqc'
     response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     return response
 
 
-@app.route('/api/export/csv/full-report')
-def export_full_report():
-    """Export comprehensive report with all data"""
-    hours = request.args.get('hours', 24, type=int)
-    
+def full_report_rows(hours):
+    """Row lists for the full report, one section at a time"""
     report = analytics_db.get_daily_report(hours // 24 or 1)
+    yield [
+        ['EqualNet Analytics Report'],
+        [f'Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'],
+        [f'Period: Last {hours} hours'],
+        [],
+        ['=== SUMMARY ==='],
+        ['Metric', 'Value'],
+        ['Unique Clients', report.get('unique_clients', 0)],
+        ['Average Bandwidth (Mbps)', report.get('avg_bandwidth', 0)],
+        ['Peak Bandwidth (Mbps)', report.get('peak_bandwidth', 0)],
+        ['Peak Hour', report.get('peak_hour', 'N/A')],
+        []
+    ]
     
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow(['EqualNet Analytics Report'])
-    writer.writerow([f'Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'])
-    writer.writerow([f'Period: Last {hours} hours'])
-    writer.writerow([])
-    
-    writer.writerow(['=== SUMMARY ==='])
-    writer.writerow(['Metric', 'Value'])
-    writer.writerow(['Unique Clients', report.get('unique_clients', 0)])
-    writer.writerow(['Average Bandwidth (Mbps)', report.get('avg_bandwidth', 0)])
-    writer.writerow(['Peak Bandwidth (Mbps)', report.get('peak_bandwidth', 0)])
-    writer.writerow(['Peak Hour', report.get('peak_hour', 'N/A')])
-    writer.writerow([])
-    
-    writer.writerow(['=== TOP BANDWIDTH CONSUMERS ==='])
+    rows = [['=== TOP BANDWIDTH CONSUMERS ===']]
     top_clients = analytics_db.get_top_clients(10, hours)
     if top_clients:
-        writer.writerow(['IP Address', 'Avg Usage', 'Total Usage', 'Sessions'])
+        rows.append(['IP Address', 'Avg Usage', 'Total Usage', 'Sessions'])
         for client in top_clients:
-            writer.writerow([
+            rows.append([
                 client['ip_address'],
                 f"{client['avg_usage']:.2f}",
                 f"{client['total_usage']:.2f}",
                 client['sessions']
             ])
-    writer.writerow([])
+    rows.append([])
+    yield rows
     
-    writer.writerow(['=== RECENT ALERTS ==='])
+    rows = [['=== RECENT ALERTS ===']]
     alerts = alert_manager.get_recent_alerts(20)
     if alerts:
-        writer.writerow(['Timestamp', 'Type', 'IP', 'Severity', 'Message'])
+        rows.append(['Timestamp', 'Type', 'IP', 'Severity', 'Message'])
         for alert in alerts:
-            writer.writerow([
+            rows.append([
                 alert['timestamp'].strftime("%Y-%m-%d %H:%M:%S"),
                 alert['type'],
                 alert.get('data', {}).get('ip', 'N/A'),
                 alert['severity'],
                 alert['message']
             ])
-    
-    response = Response(output.getvalue(), mimetype='text/csv')
-    filename = f'full_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    return response
+    yield rows
+
+
+@app.route('/api/export/csv/full-report')
+def export_full_report():
+    """Export comprehensive report with all data"""
+    hours = request.args.get('hours', 24, type=int)
+    return csv_response(full_report_rows(hours), 'full_report')
 
 
 if __name__ == '__main__':
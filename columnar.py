@@ -0,0 +1,221 @@
+"""
+Columnar Export
+Compact column-oriented binary format for history ranges, plus its reader
+
+File layout (little endian):
+    8s magic, uint32 header length, JSON header, then one zlib-compressed
+    block per column in header order.
+
+Column encodings:
+    timestamp  seconds since the epoch; first value in the header, then
+               deltas in the narrowest unsigned type that fits
+    float      float32, byte-shuffled before compression
+    int        narrowest signed type that fits; NULL stored as -1
+    dict       codes into a string dictionary kept in the header
+
+    python columnar.py export.eqc     # print a summary of a file
+"""
+import json
+import struct
+import sys
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+MAGIC = b"EQCOL\x00\x01\x00"
+HEADER_LENGTH = struct.Struct("<I")
+COMPRESS_LEVEL = 6
+
+# Exportable tables and how each column is encoded
+COLUMNAR_TABLES = {
+    "bandwidth_history": [
+        ("timestamp", "timestamp"),
+        ("total_upload", "float"),
+        ("total_download", "float"),
+        ("total_clients", "int")
+    ],
+    "client_history": [
+        ("timestamp", "timestamp"),
+        ("ip_address", "dict"),
+        ("mac_address", "dict"),
+        ("vendor", "dict"),
+        ("device_type", "dict"),
+        ("priority", "int"),
+        ("allocated_bandwidth", "float"),
+        ("used_bandwidth", "float"),
+        ("upload_speed", "float"),
+        ("download_speed", "float")
+    ]
+}
+
+UNSIGNED_TYPES = (np.uint8, np.uint16, np.uint32, np.uint64)
+SIGNED_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def select_columns(table: str) -> str:
+    """SELECT list for a table; timestamps are converted to epoch seconds in SQLite"""
+    return ", ".join(
+        f"CAST(strftime('%s', {name}) AS INTEGER) AS {name}" if kind == "timestamp"
+        else name
+        for name, kind in COLUMNAR_TABLES[table]
+    )
+
+
+def _narrowest(values: np.ndarray, types) -> np.ndarray:
+    if not len(values):
+        return values.astype(types[0])
+    lo, hi = values.min(), values.max()
+    for dtype in types:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _shuffle(data: np.ndarray) -> bytes:
+    """Group the n-th byte of every value together (compresses far better)"""
+    return data.view(np.uint8).reshape(-1, data.itemsize).T.tobytes()
+
+
+def _unshuffle(raw: bytes, dtype) -> np.ndarray:
+    itemsize = np.dtype(dtype).itemsize
+    planes = np.frombuffer(raw, dtype=np.uint8).reshape(itemsize, -1)
+    return planes.T.copy().view(dtype).ravel()
+
+
+class _ColumnBuilder:
+    """Converts one column chunk by chunk, so rows never pile up as objects"""
+
+    def __init__(self, name: str, kind: str):
+        if kind not in ("timestamp", "float", "int", "dict"):
+            raise ValueError(f"Unknown column kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.parts = []
+        self.index = {}
+
+    def add(self, values):
+        if self.kind == "timestamp":
+            part = np.array(values, dtype=np.int64)
+        elif self.kind == "float":
+            part = np.array(values, dtype=np.float64).astype(np.float32)
+        elif self.kind == "int":
+            part = np.array([-1 if v is None else v for v in values], dtype=np.int64)
+        else:
+            index = self.index
+            part = np.fromiter(
+                (index.setdefault(v, len(index)) for v in values),
+                dtype=np.int64, count=len(values)
+            )
+        self.parts.append(part)
+
+    def encode(self) -> Tuple[Dict, bytes]:
+        empty = np.float32 if self.kind == "float" else np.int64
+        data = np.concatenate(self.parts) if self.parts else np.array([], dtype=empty)
+        meta = {"name": self.name, "kind": self.kind}
+        if self.kind == "timestamp":
+            meta["first"] = int(data[0]) if len(data) else 0
+            # Rows arrive sorted, so deltas only go negative on clock steps
+            data = _narrowest(np.diff(data), UNSIGNED_TYPES + SIGNED_TYPES)
+            raw = data.tobytes()
+        elif self.kind == "float":
+            raw = _shuffle(data)
+        elif self.kind == "int":
+            data = _narrowest(data, SIGNED_TYPES)
+            raw = data.tobytes()
+        else:
+            data = _narrowest(data, UNSIGNED_TYPES)
+            meta["dictionary"] = list(self.index)
+            raw = data.tobytes()
+        meta["dtype"] = data.dtype.str
+        return meta, zlib.compress(raw, COMPRESS_LEVEL)
+
+
+def write_columnar(table: str, row_chunks: Iterable[List]) -> bytes:
+    """
+    Encode rows of `table` (selected with select_columns() and sorted by
+    timestamp) into a columnar file
+    """
+    builders = [_ColumnBuilder(name, kind) for name, kind in COLUMNAR_TABLES[table]]
+    rows_total = 0
+    for rows in row_chunks:
+        rows_total += len(rows)
+        for builder, values in zip(builders, zip(*rows)):
+            builder.add(values)
+
+    metas, blocks = [], []
+    for builder in builders:
+        meta, block = builder.encode()
+        meta["size"] = len(block)
+        metas.append(meta)
+        blocks.append(block)
+
+    header = json.dumps({
+        "table": table,
+        "rows": rows_total,
+        "columns": metas
+    }, separators=(',', ':')).encode('utf-8')
+    return b"".join([MAGIC, HEADER_LENGTH.pack(len(header)), header] + blocks)
+
+
+def read_columnar(data: bytes, decode_strings: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Load a columnar file into NumPy arrays keyed by column name
+
+    Timestamps come back as datetime64[s]. Dictionary columns are decoded
+    to object arrays of strings, or left as integer codes (with the
+    dictionary under "<name>_dictionary") when decode_strings is False.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not an EqualNet columnar file")
+    pos = len(MAGIC)
+    (length,) = HEADER_LENGTH.unpack_from(data, pos)
+    pos += HEADER_LENGTH.size
+    header = json.loads(data[pos:pos + length])
+    pos += length
+
+    result = {}
+    for meta in header["columns"]:
+        raw = zlib.decompress(data[pos:pos + meta["size"]])
+        pos += meta["size"]
+        name, kind = meta["name"], meta["kind"]
+
+        if kind == "timestamp":
+            deltas = np.frombuffer(raw, dtype=meta["dtype"])
+            seconds = np.empty(header["rows"], dtype=np.int64)
+            if header["rows"]:
+                seconds[0] = meta["first"]
+                np.cumsum(deltas, dtype=np.int64, out=seconds[1:])
+                seconds[1:] += meta["first"]
+            result[name] = seconds.astype("datetime64[s]")
+        elif kind == "float":
+            result[name] = _unshuffle(raw, meta["dtype"])
+        elif kind == "int":
+            result[name] = np.frombuffer(raw, dtype=meta["dtype"])
+        else:
+            codes = np.frombuffer(raw, dtype=meta["dtype"])
+            if decode_strings:
+                dictionary = np.array(meta["dictionary"], dtype=object)
+                result[name] = dictionary[codes]
+            else:
+                result[name] = codes
+                result[f"{name}_dictionary"] = meta["dictionary"]
+    return result
+
+
+def load(path: str, decode_strings: bool = True) -> Dict[str, np.ndarray]:
+    """Read a columnar export file from disk"""
+    with open(path, "rb") as f:
+        return read_columnar(f.read(), decode_strings)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python columnar.py <file.eqc>")
+        sys.exit(1)
+    columns = load(sys.argv[1])
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray):
+            print(f"{name:22s} {str(values.dtype):15s} {len(values)} rows")
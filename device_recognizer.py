@@ -3,9 +3,19 @@ Device Recognition Module
 Identifies device types and manufacturers from MAC addresses
 """
 import re
+import socket
 import subprocess
 import platform
-from typing import Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import psutil
+
+from neighbor_table import NeighborTable, default_table
+from oui_registry import OUIRegistry, load_registry
 
 
 MAC_VENDORS = {
@@ -326,6 +336,38 @@ MAC_VENDORS = {
     "C8:6C:87": "Huawei",
 }
 
+# IEEE organization names that don't contain the short brand name used
+# by get_device_type()
+VENDOR_ALIASES = {
+    "hewlett packard": "HP",
+    "asustek": "Asus",
+    "nest labs": "Google Nest",
+    "pcs systemtechnik": "VirtualBox",
+    "tp-link": "TP-Link"
+}
+
+# Short brand names, longest first so "Reliance Jio" wins over "Jio"
+_BRAND_PATTERN = re.compile(
+    r'\b(' + '|'.join(
+        re.escape(brand) for brand in sorted(
+            set(MAC_VENDORS.values()) | set(VENDOR_ALIASES),
+            key=len, reverse=True
+        )
+    ) + r')\b',
+    re.IGNORECASE
+)
+_BRANDS = {brand.lower(): brand for brand in MAC_VENDORS.values()}
+
+
+def short_vendor(organization: str) -> str:
+    """Map an IEEE organization name to the short brand name if known"""
+    match = _BRAND_PATTERN.search(organization)
+    if not match:
+        return organization
+    key = match.group(1).lower()
+    return VENDOR_ALIASES.get(key) or _BRANDS[key]
+
+
 DEVICE_PATTERNS = {
     "router": ["router", "gateway", "access point", "ap"],
     "laptop": ["laptop", "notebook", "macbook", "thinkpad"],
@@ -339,11 +381,38 @@ DEVICE_PATTERNS = {
 
 
 class DeviceRecognizer:
-    def __init__(self):
+    """
+    Identifies devices by IP. Identities (MAC, vendor, type, icon) are kept
+    in an LRU cache with a TTL and re-identified only when the neighbor
+    table reports a different MAC for the IP or the entry expires.
+    """
+    
+    def __init__(self, neighbors: NeighborTable = None,
+                 oui_registry: OUIRegistry = None,
+                 cache_size: int = 1024, cache_ttl: float = 600,
+                 unresolved_ttl: float = 30):
         self.custom_names = {}
+        self.neighbors = neighbors or default_table
+        self.oui_registry = oui_registry or load_registry()
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.unresolved_ttl = unresolved_ttl
+        self._cache = OrderedDict()  # ip -> (expires_at, identity)
+        self._cache_lock = threading.Lock()
+        self.cache_stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "mac_changes": 0
+        }
     
     def get_mac_address(self, ip: str) -> Optional[str]:
         try:
+            mac = self.neighbors.get_mac(ip)
+            if mac:
+                return mac
+            
             if platform.system().lower() == 'windows':
                 result = subprocess.run(
                     ['ipconfig', '/all'],
@@ -375,19 +444,7 @@ class DeviceRecognizer:
                         timeout=1
                     )
                     
-                    result = subprocess.run(
-                        ['arp', '-a'],
-                        capture_output=True,
-                        text=True,
-                        timeout=2
-                    )
-                    
-                    pattern = rf'{re.escape(ip)}\s+((?:[0-9A-Fa-f]{{2}}-?){{6}})'
-                    match = re.search(pattern, result.stdout)
-                    if match:
-                        mac = match.group(1).replace('-', ':').upper()
-                        if len(mac.replace(':', '')) == 12:
-                            return mac
+                    return self.neighbors.get_mac(ip, refresh=True)
         except Exception as e:
             print(f"⚠️ Error getting MAC for {ip}: {e}")
         return None
@@ -404,6 +461,10 @@ class DeviceRecognizer:
         except (ValueError, IndexError):
             pass
         
+        if self.oui_registry is not None:
+            organization = self.oui_registry.lookup(mac)
+            return short_vendor(organization) if organization else "Unknown"
+        
         oui = ':'.join(mac.split(':')[:3]).upper()
         return MAC_VENDORS.get(oui, "Unknown")
     
@@ -461,39 +522,174 @@ class DeviceRecognizer:
         """Set custom friendly name for device"""
         self.custom_names[ip] = name
     
-    def get_device_info(self, ip: str, hostname: str = "") -> Dict:
-        """Get complete device information"""
+    def _identify(self, ip: str, hostname: str = "") -> Dict:
+        """Resolve MAC, vendor, type and icon for an IP (uncached)"""
         mac = self.get_mac_address(ip)
         
         if not mac:
             print(f"⚠️ Could not get MAC address for {ip}")
         
+        return self._build_identity(ip, mac, hostname)
+    
+    def _build_identity(self, ip: str, mac: Optional[str], hostname: str) -> Dict:
         vendor = self.get_vendor(mac) if mac else "Unknown"
         device_type = self.get_device_type(vendor, hostname)
-        icon = self.get_device_icon(device_type)
-        
-        if ip in self.custom_names:
-            friendly_name = self.custom_names[ip]
-        else:
-            if vendor != "Unknown" and device_type != "unknown":
-                friendly_name = f"{vendor} {device_type.title()}"
-            elif vendor != "Unknown":
-                friendly_name = f"{vendor} Device"
-            elif device_type != "unknown":
-                friendly_name = f"{device_type.title()} at {ip}"
-            else:
-                last_octet = ip.split('.')[-1]
-                friendly_name = f"Device-{last_octet}"
         
         return {
             "ip": ip,
             "mac": mac or "Unknown",
             "vendor": vendor,
             "device_type": device_type,
-            "icon": icon,
-            "friendly_name": friendly_name,
+            "icon": self.get_device_icon(device_type),
             "hostname": hostname
         }
+    
+    def _friendly_name(self, identity: Dict) -> str:
+        ip = identity["ip"]
+        vendor = identity["vendor"]
+        device_type = identity["device_type"]
+        
+        if ip in self.custom_names:
+            return self.custom_names[ip]
+        if vendor != "Unknown" and device_type != "unknown":
+            return f"{vendor} {device_type.title()}"
+        if vendor != "Unknown":
+            return f"{vendor} Device"
+        if device_type != "unknown":
+            return f"{device_type.title()} at {ip}"
+        last_octet = ip.split('.')[-1]
+        return f"Device-{last_octet}"
+    
+    def _cached_identity(self, ip: str, hostname: Optional[str],
+                         current_mac: Optional[str]) -> Optional[Dict]:
+        """
+        Cached identity if still valid (hostname None matches any);
+        counts hits and misses
+        """
+        now = time.monotonic()
+        
+        with self._cache_lock:
+            entry = self._cache.get(ip)
+            if entry is not None:
+                expires_at, identity = entry
+                if expires_at <= now:
+                    self.cache_stats["expirations"] += 1
+                elif current_mac and current_mac != identity["mac"]:
+                    self.cache_stats["mac_changes"] += 1
+                elif hostname is None or identity["hostname"] == hostname:
+                    self._cache.move_to_end(ip)
+                    self.cache_stats["hits"] += 1
+                    return identity
+                del self._cache[ip]
+            self.cache_stats["misses"] += 1
+        return None
+    
+    def _store_identity(self, identity: Dict):
+        ttl = self.cache_ttl if identity["mac"] != "Unknown" else self.unresolved_ttl
+        with self._cache_lock:
+            self._cache[identity["ip"]] = (time.monotonic() + ttl, identity)
+            self._cache.move_to_end(identity["ip"])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.cache_stats["evictions"] += 1
+    
+    def invalidate(self, ip: str = None):
+        """Drop one cached identity, or all of them"""
+        with self._cache_lock:
+            if ip is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(ip, None)
+    
+    def get_cache_stats(self) -> Dict:
+        with self._cache_lock:
+            stats = dict(self.cache_stats)
+            stats["size"] = len(self._cache)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+    
+    def get_device_info(self, ip: str, hostname: str = "") -> Dict:
+        """Get complete device information"""
+        identity = self._cached_identity(ip, hostname, self.neighbors.get_mac(ip))
+        if identity is None:
+            identity = self._identify(ip, hostname)
+            self._store_identity(identity)
+        
+        info = dict(identity)
+        info["friendly_name"] = self._friendly_name(identity)
+        return info
+    
+    @staticmethod
+    def get_interface_macs() -> Dict[str, str]:
+        """IPv4 address -> MAC for this machine's own interfaces"""
+        interface_macs = {}
+        for addrs in psutil.net_if_addrs().values():
+            mac = next(
+                (a.address for a in addrs if a.family == psutil.AF_LINK), None
+            )
+            mac = (mac or "").replace('-', ':').upper()
+            if not mac or mac == "00:00:00:00:00:00":
+                continue
+            for addr in addrs:
+                if addr.family == socket.AF_INET:
+                    interface_macs[addr.address] = mac
+        return interface_macs
+    
+    @staticmethod
+    def resolve_hostnames(ips: Iterable[str], max_workers: int = 8) -> Dict[str, str]:
+        """Reverse-DNS names for IPs, looked up on a small worker pool"""
+        def lookup(ip):
+            try:
+                return socket.gethostbyaddr(ip)[0]
+            except (OSError, UnicodeError):
+                return ""
+        
+        ips = list(ips)
+        if not ips:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(ips))) as pool:
+            return dict(zip(ips, pool.map(lookup, ips)))
+    
+    def get_devices_info(self, ips: Iterable[str], resolve_hostnames: bool = False,
+                         max_workers: int = 8) -> Dict[str, Dict]:
+        """
+        Identify many devices in one pass: one neighbor table snapshot and
+        one interface table read serve every IP, cache hits cost a dict
+        lookup, and hostnames (optional) are only resolved for misses.
+        No per-IP subprocesses are run; unresolved MACs are cached briefly.
+        """
+        neighbors = self.neighbors.snapshot()
+        
+        identities = {}
+        misses = []
+        for ip in ips:
+            neighbor = neighbors.get(ip)
+            current_mac = (neighbor.mac if neighbor and neighbor.state != "incomplete"
+                           else None)
+            identity = self._cached_identity(ip, None, current_mac)
+            if identity is None:
+                misses.append((ip, current_mac))
+            else:
+                identities[ip] = identity
+        
+        if misses:
+            interface_macs = self.get_interface_macs()
+            hostnames = (self.resolve_hostnames([ip for ip, _ in misses], max_workers)
+                         if resolve_hostnames else {})
+            for ip, mac in misses:
+                identity = self._build_identity(
+                    ip, mac or interface_macs.get(ip), hostnames.get(ip, "")
+                )
+                self._store_identity(identity)
+                identities[ip] = identity
+        
+        devices = {}
+        for ip, identity in identities.items():
+            info = dict(identity)
+            info["friendly_name"] = self._friendly_name(identity)
+            devices[ip] = info
+        return devices
 
 
 if __name__ == "__main__":
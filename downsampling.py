@@ -0,0 +1,74 @@
+"""
+Downsampling
+Shape-preserving point selection for long time series charts
+
+Both methods return indices of original samples (sorted), so every point
+the dashboard draws is a real measurement.
+"""
+import numpy as np
+
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets
+
+    Keeps the first and last samples; from every bucket in between it takes
+    the sample forming the largest triangle with the previously kept sample
+    and the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) -
+            (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Minimum and maximum sample of each of threshold // 2 equal buckets"""
+    n = len(y)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    selected = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            chunk = y[start:end]
+            selected.append(start + int(np.argmin(chunk)))
+            selected.append(start + int(np.argmax(chunk)))
+    return np.unique(selected)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, points: int,
+               method: str = "lttb") -> np.ndarray:
+    """Indices of at most `points` samples chosen by `method`"""
+    if method == "minmax":
+        return minmax(y, points)
+    return lttb(x, y, points)
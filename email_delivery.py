@@ -0,0 +1,261 @@
+"""
+Email Delivery
+Pooled SMTP session and periodic alert digests
+"""
+import smtplib
+import threading
+import time
+from collections import deque
+from email.mime.text import MIMEText
+from typing import Dict, List
+
+
+SEVERITY_ORDER = ("error", "warning", "info", "success")
+
+
+class SMTPSession:
+    """
+    One authenticated SMTP connection reused across sends
+
+    The connection is opened on first use and kept until it has been idle
+    for `idle_timeout` seconds, then closed and reopened by the next send.
+    After a shorter pause (`probe_after`) it is checked with NOOP first, so
+    a server that dropped us costs a reconnect instead of a failed send.
+    TLS and login are skipped when disabled or no password is set, which is
+    what a local stand-in server needs.
+    """
+
+    def __init__(self, server: str, port: int, sender: str, password: str,
+                 use_tls: bool = True, timeout: float = 30,
+                 idle_timeout: float = 240, probe_after: float = 30):
+        self.server = server
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.probe_after = probe_after
+        self._smtp = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.password:
+                smtp.login(self.sender, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.connects += 1
+        return smtp
+
+    def _drop(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+    def _alive(self, now: float) -> bool:
+        if self._smtp is None:
+            return False
+        idle = now - self._last_used
+        if idle >= self.idle_timeout:
+            return False
+        if idle < self.probe_after:
+            return True
+        try:
+            return self._smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def send(self, recipient: str, subject: str, body: str):
+        """Send one message; raises on failure, reconnecting next time if needed"""
+        msg = MIMEText(body, 'plain')
+        msg['From'] = self.sender
+        msg['To'] = recipient
+        msg['Subject'] = subject
+
+        with self._lock:
+            now = time.monotonic()
+            if not self._alive(now):
+                self._drop()
+                self._smtp = self._connect()
+            try:
+                self._smtp.sendmail(self.sender, [recipient], msg.as_string())
+            except smtplib.SMTPResponseException:
+                # The server refused this message; the session itself is fine
+                try:
+                    self._smtp.rset()
+                except Exception:
+                    self._drop()
+                raise
+            except Exception:
+                self._drop()
+                raise
+            self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        """Release the connection once it has sat unused for idle_timeout"""
+        with self._lock:
+            if (self._smtp is not None and
+                    time.monotonic() - self._last_used >= self.idle_timeout):
+                self._drop()
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+
+class EmailDigest:
+    """
+    Collects alerts and mails them as one digest per window
+
+    A background thread sends whatever arrived during the last `window`
+    seconds as a single message grouped by severity, then by device. A
+    failed send is retried `max_retries` times with exponential backoff;
+    if it still fails the alerts go back in front of the queue for the next
+    window. At most `max_pending` alerts wait, the oldest are dropped first.
+    """
+
+    def __init__(self, session: SMTPSession, recipient: str,
+                 window: float = 60, max_retries: int = 3,
+                 retry_backoff: float = 2.0, max_pending: int = 1000):
+        self.session = session
+        self.recipient = recipient
+        self.window = window
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.queued = 0
+        self.dropped = 0
+        self.digests_sent = 0
+        self.alerts_sent = 0
+        self.retries = 0
+        self.failures = 0
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name="email-digest",
+                                        daemon=True)
+        self._thread.start()
+
+    def add(self, alert: Dict):
+        """Queue an alert for the next digest"""
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(alert)
+            self.queued += 1
+
+    def _run(self):
+        while not self._stop.wait(self.window):
+            self.flush()
+            self.session.close_if_idle()
+
+    def send(self, subject: str, body: str) -> bool:
+        """Send one message through the pooled session, with retries"""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                if self._stop.wait(self.retry_backoff * 2 ** (attempt - 1)):
+                    break
+            try:
+                self.session.send(self.recipient, subject, body)
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Failed to send email (attempt {attempt + 1}): {e}")
+        self.failures += 1
+        return False
+
+    def flush(self) -> bool:
+        """Send everything queued now as one digest"""
+        with self._send_lock:
+            with self._lock:
+                alerts = list(self._pending)
+                self._pending.clear()
+            if not alerts:
+                return True
+
+            if self.send(*self.format_digest(alerts)):
+                self.digests_sent += 1
+                self.alerts_sent += len(alerts)
+                return True
+
+            with self._lock:
+                room = self._pending.maxlen - len(self._pending)
+                self.dropped += max(0, len(alerts) - room)
+                self._pending.extendleft(reversed(alerts[-room:] if room else []))
+            return False
+
+    @staticmethod
+    def format_digest(alerts: List[Dict]):
+        """(subject, body) for a digest of alerts"""
+        groups = {}
+        for alert in alerts:
+            device = (alert.get("data") or {}).get("ip") or "network"
+            groups.setdefault(alert["severity"], {}).setdefault(device, []).append(alert)
+
+        severities = sorted(groups, key=lambda s: (
+            SEVERITY_ORDER.index(s) if s in SEVERITY_ORDER else len(SEVERITY_ORDER), s
+        ))
+        counts = ", ".join(
+            f"{sum(len(a) for a in groups[s].values())} {s}" for s in severities
+        )
+        first = alerts[0]["timestamp"].strftime('%Y-%m-%d %H:%M:%S')
+        last = alerts[-1]["timestamp"].strftime('%H:%M:%S')
+
+        lines = [
+            "EqualNet Network Monitor Alert Digest",
+            "",
+            f"{len(alerts)} alerts from {first} to {last}",
+        ]
+        for severity in severities:
+            devices = groups[severity]
+            lines.append("")
+            lines.append(f"{severity.upper()} ({sum(len(a) for a in devices.values())})")
+            for device in sorted(devices):
+                lines.append(f"  {device}")
+                for alert in devices[device]:
+                    lines.append(
+                        f"    {alert['timestamp'].strftime('%H:%M:%S')}  "
+                        f"{alert['type']}: {alert['message']}"
+                    )
+        lines += ["", "---", "EqualNet Bandwidth Management System"]
+        return f"EqualNet Alert Digest: {counts}", "\n".join(lines)
+
+    def stop(self, flush: bool = True):
+        """Stop the digest thread, optionally sending what is still queued"""
+        self._stop.set()
+        self._thread.join(timeout=5)
+        if flush:
+            self._stop.clear()
+            self.flush()
+            self._stop.set()
+        self.session.close()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "window_seconds": self.window,
+            "pending": pending,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "digests_sent": self.digests_sent,
+            "alerts_sent": self.alerts_sent,
+            "retries": self.retries,
+            "failures": self.failures,
+            "connects": self.session.connects,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,99 @@
+"""
+Event Stream
+Fan-out of one serialized payload per tick to every Server-Sent Events viewer
+"""
+import queue
+import threading
+from typing import Dict, Iterator, Optional
+
+
+KEEPALIVE_INTERVAL = 15  # seconds between ": keepalive" comments
+
+
+def format_event(data: str, event: Optional[str] = None,
+                 event_id: Optional[int] = None) -> bytes:
+    """Encode one SSE frame; `data` must already be serialized"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class Broadcaster:
+    """
+    Publish/subscribe hub for pre-encoded SSE frames
+
+    The publisher encodes each message once; every subscriber gets the same
+    bytes through its own bounded queue. A viewer that stops reading only
+    loses its own oldest frames - it never blocks the publisher or other
+    viewers.
+    """
+
+    def __init__(self, queue_size: int = 8):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._last = None
+        self._event_id = 0
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> queue.Queue:
+        """New subscriber queue, primed with the latest frame"""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self._last is not None:
+                q.put_nowait(self._last)
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, data: str, event: Optional[str] = None):
+        """Encode `data` once and hand it to every subscriber"""
+        with self._lock:
+            self._event_id += 1
+            frame = format_event(data, event, self._event_id)
+            self._last = frame
+            self.published += 1
+            subscribers = list(self._subscribers)
+
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(frame)
+                    break
+                except queue.Full:
+                    # Slow viewer: drop its oldest frame, keep the newest
+                    try:
+                        q.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def stream(self, keepalive: float = KEEPALIVE_INTERVAL) -> Iterator[bytes]:
+        """Generator for a streaming response; unsubscribes when closed"""
+        q = self.subscribe()
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=keepalive)
+                except queue.Empty:
+                    yield b": keepalive\n\n"
+        finally:
+            self.unsubscribe(q)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": self.dropped,
+                "queue_size": self.queue_size
+            }
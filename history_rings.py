@@ -0,0 +1,153 @@
+"""
+History Rings
+Fixed-size in-memory traffic history at several resolutions
+"""
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# (name, seconds per sample, capacity): 1 hour, 1 day and 1 week
+DEFAULT_LEVELS = [
+    ("2s", 2, 1800),
+    ("1m", 60, 1440),
+    ("15m", 900, 672)
+]
+
+RANGE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+RANGE_PATTERN = re.compile(r'^(\d+)([smhd]?)$')
+
+
+def parse_range(value: str) -> Optional[int]:
+    """Seconds for '90', '15m', '1h', '7d'; None if malformed"""
+    match = RANGE_PATTERN.match((value or "").strip().lower())
+    if not match:
+        return None
+    return int(match.group(1)) * RANGE_UNITS[match.group(2)]
+
+
+class RingBuffer:
+    """Array-backed ring of (time, upload, download) samples"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, 3), dtype=np.float64)
+        self.head = 0  # next slot to write
+        self.count = 0
+
+    def append(self, timestamp: float, upload: float, download: float):
+        self.data[self.head] = (timestamp, upload, download)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def ordered(self) -> np.ndarray:
+        """Samples oldest first (a copy)"""
+        if self.count < self.capacity:
+            return self.data[:self.count].copy()
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+    def latest(self, n: int) -> np.ndarray:
+        n = min(n, self.count)
+        index = (self.head - n + np.arange(n)) % self.capacity
+        return self.data[index]
+
+
+class _Level:
+    def __init__(self, name: str, resolution: int, capacity: int):
+        self.name = name
+        self.resolution = resolution
+        self.ring = RingBuffer(capacity)
+        # Running mean of finer samples in the bucket being filled
+        self.bucket = None
+        self.sums = np.zeros(2)
+        self.samples = 0
+
+    @property
+    def span(self) -> int:
+        return self.resolution * self.ring.capacity
+
+    def pending(self) -> Optional[np.ndarray]:
+        if not self.samples:
+            return None
+        upload, download = self.sums / self.samples
+        return np.array([[self.bucket * self.resolution, upload, download]])
+
+
+class TrafficHistory:
+    """
+    Multi-resolution traffic history
+
+    The finest ring stores every sample as recorded. Each coarser ring is
+    fed from the one below it: finer samples are averaged per bucket and
+    the bucket is written when a sample from the next bucket arrives. Reads
+    pick the finest ring that covers the requested range, and include the
+    partially filled bucket so coarse charts reach the present.
+    """
+
+    def __init__(self, levels=None):
+        self.levels = [_Level(*level) for level in (levels or DEFAULT_LEVELS)]
+        self._lock = threading.Lock()
+
+    def add(self, upload: float, download: float, timestamp: float = None):
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            self.levels[0].ring.append(timestamp, upload, download)
+            self._feed(1, timestamp, upload, download)
+
+    def _feed(self, depth: int, timestamp: float, upload: float, download: float):
+        if depth >= len(self.levels):
+            return
+        level = self.levels[depth]
+        bucket = int(timestamp // level.resolution)
+        if level.bucket is not None and bucket != level.bucket:
+            start = level.bucket * level.resolution
+            mean_up, mean_down = level.sums / level.samples
+            level.ring.append(start, mean_up, mean_down)
+            level.sums[:] = 0
+            level.samples = 0
+            self._feed(depth + 1, start, mean_up, mean_down)
+        level.bucket = bucket
+        level.sums += (upload, download)
+        level.samples += 1
+
+    def pick_level(self, seconds: int) -> _Level:
+        """Finest level whose ring spans `seconds`, else the coarsest"""
+        for level in self.levels:
+            if level.span >= seconds:
+                return level
+        return self.levels[-1]
+
+    def series(self, seconds: int, now: float = None) -> Dict[str, List]:
+        """Samples from the last `seconds`, from the best-fitting ring"""
+        if now is None:
+            now = time.time()
+        level = self.pick_level(seconds)
+        with self._lock:
+            samples = level.ring.ordered()
+            pending = level.pending() if level is not self.levels[0] else None
+        if pending is not None:
+            samples = np.concatenate((samples, pending))
+        samples = samples[samples[:, 0] >= now - seconds]
+        return self._as_dict(samples, level)
+
+    def recent(self, n: int = 30) -> Dict[str, List]:
+        """The last `n` samples of the finest ring"""
+        with self._lock:
+            samples = self.levels[0].ring.latest(n)
+        return self._as_dict(samples, self.levels[0])
+
+    @staticmethod
+    def _as_dict(samples: np.ndarray, level: _Level) -> Dict[str, List]:
+        label_format = "%H:%M:%S" if level.resolution < 60 else "%m-%d %H:%M"
+        return {
+            "resolution": level.name,
+            "time": [time.strftime(label_format, time.localtime(t))
+                     for t in samples[:, 0]],
+            "timestamp": samples[:, 0].tolist(),
+            "upload": np.round(samples[:, 1], 2).tolist(),
+            "download": np.round(samples[:, 2], 2).tolist()
+        }
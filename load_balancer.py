@@ -1,14 +1,73 @@
+import bisect
 import random
+import threading
+
+import numpy as np
+
+
+# Above this many prioritised clients the pairwise leveling pass is too slow
+# (quadratic, sequential) and a running-minimum clamp is used instead
+EXACT_ORDERING_LIMIT = 64
+
+
+def _enforce_priority_order(values):
+    """
+    Make allocations non-increasing in priority order (`values` is already
+    sorted highest priority first).
+
+    Small sets get the original pairwise pass: whenever a later client has
+    more than an earlier one, half the gap moves to the earlier client.
+    An already-ordered input costs a single vector comparison. Larger sets
+    cap each value at the minimum of the values ranked above it.
+    """
+    if len(values) < 2 or np.all(values[:-1] >= values[1:]):
+        return values
+    if len(values) > EXACT_ORDERING_LIMIT:
+        return np.minimum.accumulate(values)
+
+    values = values.copy()
+    for i in range(len(values) - 1):
+        current = values[i]
+        for j in (np.flatnonzero(values[i + 1:] > current) + i + 1).tolist():
+            if values[j] > current:
+                current = values[j] = (current + values[j]) / 2
+        values[i] = current
+    return values
 
 
 class LoadBalancer:
-    def __init__(self, total_bandwidth, max_priority=5, min_bandwidth_percent=10):
+    """
+    Long-lived priority/usage based bandwidth allocator
+    
+    Clients live in NumPy arrays indexed by a stable slot per IP, so
+    distribute_bandwidth() and rebalance_load() work on whole arrays
+    rather than per-client Python loops. Clients are changed
+    with add_client / remove_client / update_priority / update_usage;
+    total priority, total usage and the priority order are kept up to
+    date by those deltas instead of being rebuilt every tick.
+    `allocations`, `priorities` and `usage` are exposed as dict snapshots.
+    """
+
+    def __init__(self, total_bandwidth, max_priority=5, min_bandwidth_percent=10,
+                 capacity=64):
         self.total_bandwidth = total_bandwidth
         self.max_priority = max_priority
         self.min_bandwidth_percent = min_bandwidth_percent
-        self.allocations = {}
-        self.priorities = {}
-        self.usage = {}
+        self._lock = threading.RLock()
+        self._slots = {}
+        self._ips = []
+        self._free = []
+        self._active = np.zeros(capacity, dtype=bool)
+        self._has_priority = np.zeros(capacity, dtype=bool)
+        self._priority = np.zeros(capacity)
+        self._usage = np.zeros(capacity)
+        self._alloc = np.zeros(capacity)
+        self._total_priority = 0.0
+        self._total_usage = 0.0
+        self._order = []
+        self._ranked = None
+        self._dirty = True
+        self._allocations = {}
 
     def _validate_priority(self, priority):
         """Validate and clamp priority to allowed range (1 to max_priority)"""
@@ -18,101 +77,269 @@ class LoadBalancer:
             return self.max_priority
         return priority
 
+    def _grow(self):
+        capacity = max(1, len(self._active)) * 2
+        for name in ("_active", "_has_priority", "_priority", "_usage", "_alloc"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _active_slots(self):
+        return np.flatnonzero(self._active[:len(self._ips)])
+
+    def _set_priority(self, slot, priority):
+        """Set or clear a slot's priority, keeping totals and order cached"""
+        if self._has_priority[slot]:
+            old = self._priority[slot]
+            if priority is not None and old == priority:
+                return
+            self._total_priority -= old
+            del self._order[bisect.bisect_left(self._order, (-old, slot))]
+        if priority is None:
+            self._has_priority[slot] = False
+            self._priority[slot] = 0
+        else:
+            self._has_priority[slot] = True
+            self._priority[slot] = priority
+            self._total_priority += priority
+            bisect.insort(self._order, (-priority, slot))
+        self._ranked = None
+        self._dirty = True
+
+    def __contains__(self, ip):
+        return ip in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    @property
+    def clients(self):
+        return list(self._slots)
+
+    @property
+    def allocations(self):
+        with self._lock:
+            slots = self._active_slots()
+            return dict(zip([self._ips[i] for i in slots],
+                            self._alloc[slots].tolist()))
+
+    @property
+    def priorities(self):
+        with self._lock:
+            slots = self._active_slots()
+            slots = slots[self._has_priority[slots]]
+            return dict(zip([self._ips[i] for i in slots],
+                            self._priority[slots].astype(int).tolist()))
+
+    @property
+    def usage(self):
+        with self._lock:
+            slots = self._active_slots()
+            return dict(zip([self._ips[i] for i in slots],
+                            self._usage[slots].tolist()))
+
+    def configure(self, total_bandwidth=None, max_priority=None,
+                  min_bandwidth_percent=None):
+        """Update limits; returns True if anything changed"""
+        with self._lock:
+            changed = False
+            if total_bandwidth is not None and total_bandwidth != self.total_bandwidth:
+                self.total_bandwidth = total_bandwidth
+                changed = True
+            if (min_bandwidth_percent is not None and
+                    min_bandwidth_percent != self.min_bandwidth_percent):
+                self.min_bandwidth_percent = min_bandwidth_percent
+                changed = True
+            if max_priority is not None and max_priority != self.max_priority:
+                self.max_priority = max_priority
+                for slot in np.flatnonzero(self._has_priority).tolist():
+                    self._set_priority(
+                        slot, self._validate_priority(self._priority[slot])
+                    )
+                changed = True
+            if changed:
+                self._dirty = True
+            return changed
+
+    def add_client(self, ip, priority=None, usage=0.0):
+        """Add a client (no-op for known IPs); returns True if added"""
+        with self._lock:
+            if ip in self._slots:
+                return False
+            if self._free:
+                slot = self._free.pop()
+                self._ips[slot] = ip
+            else:
+                slot = len(self._ips)
+                if slot >= len(self._active):
+                    self._grow()
+                self._ips.append(ip)
+            self._slots[ip] = slot
+            self._active[slot] = True
+            self._has_priority[slot] = False
+            self._priority[slot] = 0
+            self._usage[slot] = usage
+            self._alloc[slot] = 0
+            self._total_usage += usage
+            if priority is not None:
+                self._set_priority(slot, self._validate_priority(priority))
+            self._dirty = True
+            return True
+
+    def remove_client(self, ip):
+        """Remove a client; returns True if it was known"""
+        with self._lock:
+            slot = self._slots.pop(ip, None)
+            if slot is None:
+                return False
+            self._set_priority(slot, None)
+            self._total_usage -= self._usage[slot]
+            self._active[slot] = False
+            self._usage[slot] = 0
+            self._alloc[slot] = 0
+            self._ips[slot] = None
+            self._free.append(slot)
+            if not self._slots:
+                self._total_usage = 0.0
+                self._total_priority = 0.0
+            self._dirty = True
+            return True
+
+    def update_priority(self, ip, priority):
+        """Change a client's priority (None clears it); False if unknown"""
+        with self._lock:
+            slot = self._slots.get(ip)
+            if slot is None:
+                return False
+            self._set_priority(
+                slot, None if priority is None else self._validate_priority(priority)
+            )
+            return True
+
+    def update_usage(self, ip, usage):
+        """Set a client's current usage, adding the client if unknown"""
+        with self._lock:
+            slot = self._slots.get(ip)
+            if slot is None:
+                self.add_client(ip, usage=usage)
+                return
+            old = self._usage[slot]
+            if old != usage:
+                self._usage[slot] = usage
+                self._total_usage += usage - old
+                self._dirty = True
+
+    def sync_clients(self, clients, priorities=None, usage=None):
+        """
+        Make the client set match `clients`: unknown IPs are added (with
+        their entry from `priorities`, and from `usage` or 0.0), missing
+        ones removed. Returns (added, removed) lists.
+        """
+        priorities = priorities or {}
+        with self._lock:
+            current = set(clients)
+            removed = [ip for ip in self._slots if ip not in current]
+            for ip in removed:
+                self.remove_client(ip)
+            added = []
+            for ip in clients:
+                if ip not in self._slots:
+                    initial = usage(ip) if callable(usage) else (usage or {}).get(ip, 0.0)
+                    self.add_client(ip, priorities.get(ip), initial)
+                    added.append(ip)
+            return added, removed
+
     def register_clients(self, clients, priorities):
-        self.priorities = {
-            ip: self._validate_priority(pr) 
-            for ip, pr in priorities.items()
-        }
-        for ip in clients:
-            self.allocations[ip] = 0
-            self.usage[ip] = random.uniform(0.1, 1.0)
+        """Replace all clients and priorities (simulated usage)"""
+        with self._lock:
+            self.sync_clients(clients)
+            for ip in clients:
+                self.update_priority(ip, priorities.get(ip))
+                self.update_usage(ip, random.uniform(0.1, 1.0))
+                self._alloc[self._slots[ip]] = 0
+
+    def _ranked_slots(self):
+        """Slots with a priority, highest priority first (cached)"""
+        if self._ranked is None:
+            self._ranked = np.fromiter(
+                (slot for _, slot in self._order), dtype=np.intp,
+                count=len(self._order)
+            )
+        return self._ranked
 
     def distribute_bandwidth(self):
         """Distribute bandwidth based on priority with minimum guarantees"""
-        if not self.priorities:
+        with self._lock:
+            slots = self._ranked_slots()
+            if not len(slots):
+                return self.allocations
+            
+            total_priority = self._total_priority
+            min_bandwidth = (self.min_bandwidth_percent / 100) * self.total_bandwidth
+            num_clients = len(slots)
+            
+            reserved_bandwidth = min_bandwidth * num_clients
+            available_bandwidth = self.total_bandwidth - reserved_bandwidth
+            
+            if available_bandwidth < 0:
+                available_bandwidth = self.total_bandwidth
+                min_bandwidth = 0
+            
+            weight = self._priority[slots] / total_priority
+            self._alloc[slots] = np.round(
+                min_bandwidth + weight * available_bandwidth, 2
+            )
+            self._dirty = True
+            
             return self.allocations
-        
-        total_priority = sum(self.priorities.values())
-        min_bandwidth = (self.min_bandwidth_percent / 100) * self.total_bandwidth
-        num_clients = len(self.priorities)
-        
-        reserved_bandwidth = min_bandwidth * num_clients
-        available_bandwidth = self.total_bandwidth - reserved_bandwidth
-        
-        if available_bandwidth < 0:
-            available_bandwidth = self.total_bandwidth
-            min_bandwidth = 0
-        
-        for ip, pr in self.priorities.items():
-            weight = pr / total_priority
-            priority_allocation = weight * available_bandwidth
-            self.allocations[ip] = round(min_bandwidth + priority_allocation, 2)
-        
-        return self.allocations
-
-    def update_usage(self, ip, usage):
-        self.usage[ip] = usage
 
     def rebalance_load(self):
         """Rebalance with priority enforcement and limits"""
-        total_usage = sum(self.usage.values())
-        if total_usage == 0:
-            return self.allocations
+        with self._lock:
+            if not self._dirty:
+                return dict(self._allocations)
 
-        if not self.priorities:
-            return self.allocations
+            n = len(self._ips)
+            active = self._active[:n]
+            total_usage = self._total_usage
+            if total_usage <= 0 or not self._order:
+                # No usage measured yet: fall back to the priority-only split
+                if self._order:
+                    self.distribute_bandwidth()
+                self._allocations = self.allocations
+                self._dirty = False
+                return dict(self._allocations)
 
-        temp_allocations = {}
-        for ip in self.allocations:
-            if ip not in self.priorities:
-                temp_allocations[ip] = self.allocations[ip]
-                continue
-                
-            usage_ratio = self.usage[ip] / total_usage
-            total_prio = sum(self.priorities.values())
-            priority_boost = self.priorities[ip] / total_prio
-            new_alloc = (
-                (0.6 * usage_ratio + 0.4 * priority_boost) * 
-                self.total_bandwidth
+            # Clients without a priority start from zero every pass (and are
+            # lifted to min_bandwidth below); seeding them with last tick's
+            # allocation would feed it back and ratchet it upward
+            has_priority = self._has_priority[:n]
+            temp_allocations = np.where(
+                has_priority,
+                (0.6 * self._usage[:n] / total_usage +
+                 0.4 * self._priority[:n] / self._total_priority) *
+                self.total_bandwidth,
+                0.0
             )
-            temp_allocations[ip] = new_alloc
-
-        sorted_clients = sorted(
-            self.priorities.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        
-        for i in range(len(sorted_clients)):
-            current_ip, current_priority = sorted_clients[i]
-            
-            if current_ip not in temp_allocations:
-                continue
+
+            ranked = self._ranked_slots()
+            temp_allocations[ranked] = _enforce_priority_order(
+                temp_allocations[ranked]
+            )
+
+            min_bandwidth = (self.min_bandwidth_percent / 100) * self.total_bandwidth
+            np.maximum(temp_allocations, min_bandwidth, out=temp_allocations)
+            temp_allocations[~active] = 0
+
+            total_allocated = temp_allocations.sum()
+            if total_allocated > 0:
+                scale_factor = self.total_bandwidth / total_allocated
+                self._alloc[:n] = np.round(temp_allocations * scale_factor, 2)
             
-            for j in range(i + 1, len(sorted_clients)):
-                lower_ip, lower_priority = sorted_clients[j]
-                
-                if lower_ip not in temp_allocations:
-                    continue
-                
-                if temp_allocations[lower_ip] > temp_allocations[current_ip]:
-                    excess = temp_allocations[lower_ip] - temp_allocations[current_ip]
-                    redistribute = excess * 0.5
-                    temp_allocations[current_ip] += redistribute
-                    temp_allocations[lower_ip] -= redistribute
-
-        min_bandwidth = (self.min_bandwidth_percent / 100) * self.total_bandwidth
-        for ip in temp_allocations:
-            if temp_allocations[ip] < min_bandwidth:
-                temp_allocations[ip] = min_bandwidth
-
-        total_allocated = sum(temp_allocations.values())
-        if total_allocated > 0:
-            scale_factor = self.total_bandwidth / total_allocated
-            for ip in temp_allocations:
-                self.allocations[ip] = round(temp_allocations[ip] * scale_factor, 2)
-        
-        return self.allocations
+            self._allocations = self.allocations
+            self._dirty = False
+            return dict(self._allocations)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""
+Neighbor Table
+One cached snapshot of the ARP/neighbor table shared by every lookup
+"""
+import json
+import os
+import platform
+import re
+import subprocess
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+
+class Neighbor(NamedTuple):
+    mac: str  # upper-case, colon separated
+    interface: str
+    state: str  # "dynamic", "static" or "incomplete"
+
+
+PROC_ARP = "/proc/net/arp"
+
+# /proc/net/arp flags
+ATF_COM = 0x02
+ATF_PERM = 0x04
+
+WINDOWS_ARP_ENTRY = re.compile(
+    r'^\s+(\d+\.\d+\.\d+\.\d+)\s+((?:[\da-fA-F]{2}-){5}[\da-fA-F]{2})\s+(\w+)'
+)
+
+
+def normalize_mac(mac: str) -> str:
+    return mac.replace('-', ':').upper()
+
+
+def parse_proc_arp(text: str) -> Dict[str, Neighbor]:
+    """Parse /proc/net/arp"""
+    neighbors = {}
+    for line in text.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) < 6:
+            continue
+        ip, flags, mac, device = parts[0], int(parts[2], 16), parts[3], parts[5]
+        if not flags & ATF_COM:
+            state = "incomplete"
+        elif flags & ATF_PERM:
+            state = "static"
+        else:
+            state = "dynamic"
+        neighbors[ip] = Neighbor(normalize_mac(mac), device, state)
+    return neighbors
+
+
+def parse_ip_neigh_json(text: str) -> Dict[str, Neighbor]:
+    """Parse `ip -j neigh` output"""
+    neighbors = {}
+    for entry in json.loads(text or "[]"):
+        states = entry.get("state", [])
+        mac = entry.get("lladdr")
+        if not mac or "FAILED" in states or "INCOMPLETE" in states:
+            state = "incomplete"
+        elif "PERMANENT" in states or "NOARP" in states:
+            state = "static"
+        else:
+            state = "dynamic"
+        neighbors[entry["dst"]] = Neighbor(
+            normalize_mac(mac or "00:00:00:00:00:00"), entry.get("dev", ""), state
+        )
+    return neighbors
+
+
+def parse_windows_arp(text: str) -> Dict[str, Neighbor]:
+    """Parse Windows `arp -a` output (entries grouped under Interface: lines)"""
+    neighbors = {}
+    interface = ""
+    for line in text.splitlines():
+        if line.startswith('Interface:'):
+            interface = line.split()[1]
+            continue
+        match = WINDOWS_ARP_ENTRY.match(line)
+        if match:
+            ip, mac, kind = match.groups()
+            neighbors[ip] = Neighbor(normalize_mac(mac), interface, kind.lower())
+    return neighbors
+
+
+class NeighborTable:
+    """
+    TTL-cached IP -> Neighbor(mac, interface, state) map
+
+    The whole table is read in one go (/proc/net/arp or `ip -j neigh` on
+    Linux, `arp -a` elsewhere) at most once per `ttl` seconds; lookups in
+    between are served from memory.
+    """
+
+    def __init__(self, ttl: float = 2.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._neighbors = {}
+        self._read_at = None
+
+    def _read(self) -> Dict[str, Neighbor]:
+        if platform.system().lower() == 'linux':
+            if os.access(PROC_ARP, os.R_OK):
+                with open(PROC_ARP) as f:
+                    return parse_proc_arp(f.read())
+            result = subprocess.run(
+                ['ip', '-j', 'neigh'],
+                capture_output=True,
+                text=True,
+                timeout=3
+            )
+            return parse_ip_neigh_json(result.stdout)
+
+        result = subprocess.run(
+            ['arp', '-a'],
+            capture_output=True,
+            text=True,
+            timeout=3
+        )
+        return parse_windows_arp(result.stdout)
+
+    def snapshot(self, refresh: bool = False) -> Dict[str, Neighbor]:
+        """The current table; re-read if older than the TTL"""
+        with self._lock:
+            now = time.monotonic()
+            if (refresh or self._read_at is None or
+                    now - self._read_at >= self.ttl):
+                try:
+                    self._neighbors = self._read()
+                except Exception as e:
+                    print(f"⚠️ Could not read neighbor table: {e}")
+                self._read_at = now
+            return self._neighbors
+
+    def get(self, ip: str, refresh: bool = False) -> Optional[Neighbor]:
+        return self.snapshot(refresh).get(ip)
+
+    def get_mac(self, ip: str, refresh: bool = False) -> Optional[str]:
+        """MAC of a resolved neighbor, None if unknown or incomplete"""
+        neighbor = self.get(ip, refresh)
+        if neighbor is None or neighbor.state == "incomplete":
+            return None
+        return neighbor.mac
+
+    def invalidate(self):
+        with self._lock:
+            self._read_at = None
+
+
+# Shared by monitor and DeviceRecognizer so one read serves a whole tick
+default_table = NeighborTable()
+
+
+if __name__ == "__main__":
+    for ip, neighbor in sorted(default_table.snapshot().items()):
+        print(f"{ip:15s}  {neighbor.mac}  {neighbor.interface:15s}  {neighbor.state}")
@@ -1,10 +1,22 @@
 """
 Network Scanner - Actively scans subnet for all devices
+Probes run on an asyncio event loop under a concurrency limit, so large
+ranges (/22, /16) need no thread per host
 """
+import asyncio
+import ipaddress
+import platform
 import subprocess
-import threading
 import re
-from typing import List, Tuple
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple
+
+# Probes in flight at once
+DEFAULT_CONCURRENCY = 128
+# Seconds to wait for a single host to answer
+DEFAULT_TIMEOUT = 0.3
+# Ports tried by TCP-connect probes; a refused connection still proves the
+# host is up
+TCP_PROBE_PORTS = (80, 443, 22, 445, 62078)
 
 
 def get_local_ip_and_subnet():
@@ -41,33 +53,124 @@ def get_local_ip_and_subnet():
     return None, None
 
 
-def ping_host(ip: str, results: List[Tuple[str, bool]]):
-    """Ping a single host and store result"""
+def ping_command(ip: str, timeout: float = DEFAULT_TIMEOUT) -> List[str]:
+    """Single-echo ping command line for this platform"""
+    if platform.system().lower() == 'windows':
+        return ['ping', '-n', '1', '-w', str(int(timeout * 1000)), ip]
+    return ['ping', '-c', '1', '-W', str(max(1, round(timeout))), ip]
+
+
+async def ping_probe(ip: str, timeout: float = DEFAULT_TIMEOUT) -> bool:
+    """Ping a host with an async subprocess"""
     try:
-        result = subprocess.run(
-            ['ping', '-n', '1', '-w', '300', ip],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            timeout=1
+        process = await asyncio.create_subprocess_exec(
+            *ping_command(ip, timeout),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
         )
-        if result.returncode == 0:
-            results.append((ip, True))
-    except Exception:
-        pass
+    except OSError:
+        return False
+    try:
+        return await asyncio.wait_for(process.wait(), timeout + 1) == 0
+    except asyncio.TimeoutError:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass  # exited between the timeout and the kill
+        await process.wait()
+        return False
+
+
+async def tcp_probe(ip: str, timeout: float = DEFAULT_TIMEOUT,
+                    ports: Tuple[int, ...] = TCP_PROBE_PORTS) -> bool:
+    """Check a host by TCP connect; no subprocess involved"""
+    for port in ports:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, port), timeout
+            )
+        except ConnectionRefusedError:
+            return True
+        except (OSError, asyncio.TimeoutError):
+            continue
+        writer.close()
+        return True
+    return False
 
 
-def scan_subnet(subnet: str = None, start: int = 1, end: int = 254) -> List[str]:
+PROBES = {
+    "ping": ping_probe,
+    "tcp": tcp_probe
+}
+
+
+def expand_targets(subnet: str, start: int = 1, end: int = 254) -> Iterator[str]:
     """
-    Scan a subnet for active devices
-    
-    Args:
-        subnet: Subnet to scan (e.g., "192.168.29")
-        start: Starting host number (default: 1)
-        end: Ending host number (default: 254)
-    
-    Returns:
-        List of active IP addresses
+    Hosts to scan: a 3-octet prefix ("192.168.29") with a start/end host
+    range, or a CIDR network ("10.0.0.0/22") whose hosts are all scanned
     """
+    if '/' in subnet:
+        for host in ipaddress.ip_network(subnet, strict=False).hosts():
+            yield str(host)
+        return
+    for i in range(start, end + 1):
+        yield f"{subnet}.{i}"
+
+
+async def probe_hosts(hosts: Iterable[str], method: str = "ping",
+                      concurrency: int = DEFAULT_CONCURRENCY,
+                      timeout: float = DEFAULT_TIMEOUT) -> AsyncIterator[str]:
+    """
+    Probe hosts concurrently and yield each IP as soon as it answers
+
+    At most `concurrency` probes (and so at most that many ping
+    processes) are in flight; hosts are pulled from the iterable lazily.
+    """
+    probe = PROBES[method]
+    semaphore = asyncio.Semaphore(concurrency)
+    found = asyncio.Queue()
+    done = object()
+
+    async def run(ip):
+        try:
+            if await probe(ip, timeout):
+                await found.put(ip)
+        finally:
+            semaphore.release()
+
+    async def feed():
+        tasks = set()
+        try:
+            for ip in hosts:
+                await semaphore.acquire()
+                task = asyncio.ensure_future(run(ip))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await found.put(done)
+
+    feeder = asyncio.ensure_future(feed())
+    try:
+        while True:
+            ip = await found.get()
+            if ip is done:
+                break
+            yield ip
+    finally:
+        feeder.cancel()
+
+
+def _sort_ips(ips: Iterable[str]) -> List[str]:
+    return sorted(ips, key=lambda x: [int(p) for p in x.split('.')])
+
+
+async def scan_subnet_async(subnet: str = None, start: int = 1, end: int = 254,
+                            method: str = "ping",
+                            concurrency: int = DEFAULT_CONCURRENCY,
+                            timeout: float = DEFAULT_TIMEOUT) -> List[str]:
+    """Async variant of scan_subnet()"""
     if not subnet:
         local_ip, subnet = get_local_ip_and_subnet()
         if not subnet:
@@ -75,43 +178,46 @@ def scan_subnet(subnet: str = None, start: int = 1, end: int = 254) -> List[str]
             return []
         print(f"📡 Scanning subnet {subnet}.0/24 ...")
     
-    results = []
-    threads = []
-    
-    for i in range(start, end + 1):
-        ip = f"{subnet}.{i}"
-        thread = threading.Thread(target=ping_host, args=(ip, results))
-        thread.daemon = True
-        thread.start()
-        threads.append(thread)
-        
-        if len(threads) >= 50:
-            for t in threads:
-                t.join(timeout=2)
-            threads = []
-    
-    for thread in threads:
-        thread.join(timeout=2)
-    
-    active_ips = sorted([ip for ip, active in results if active],
-                       key=lambda x: [int(p) for p in x.split('.')])
+    active_ips = _sort_ips([
+        ip async for ip in probe_hosts(
+            expand_targets(subnet, start, end), method, concurrency, timeout
+        )
+    ])
     
     print(f"✅ Found {len(active_ips)} active devices")
     return active_ips
 
 
-def get_all_network_devices() -> List[str]:
+def scan_subnet(subnet: str = None, start: int = 1, end: int = 254,
+                method: str = "ping",
+                concurrency: int = DEFAULT_CONCURRENCY,
+                timeout: float = DEFAULT_TIMEOUT) -> List[str]:
     """
-    Get all devices on local network using ARP + active scanning
+    Scan a subnet for active devices
+    
+    Args:
+        subnet: Subnet to scan (e.g., "192.168.29" or "10.0.0.0/22")
+        start: Starting host number (default: 1, 3-octet prefixes only)
+        end: Ending host number (default: 254, 3-octet prefixes only)
+        method: "ping" (async ping subprocess) or "tcp" (TCP connect)
+        concurrency: Maximum probes in flight
+        timeout: Seconds to wait for each host
     
     Returns:
-        List of all device IPs (from ARP + scan)
+        List of active IP addresses
     """
+    return asyncio.run(scan_subnet_async(
+        subnet, start, end, method, concurrency, timeout
+    ))
+
+
+async def get_all_network_devices_async(method: str = "ping") -> List[str]:
+    """Async variant of get_all_network_devices()"""
     import monitor
     
-    arp_devices = set(monitor.get_connected_devices())
+    arp_devices = set(await asyncio.to_thread(monitor.get_connected_devices))
     
-    local_ip, subnet = get_local_ip_and_subnet()
+    local_ip, subnet = await asyncio.to_thread(get_local_ip_and_subnet)
     if local_ip:
         arp_devices.discard(local_ip)
     
@@ -119,20 +225,27 @@ def get_all_network_devices() -> List[str]:
     
     if subnet:
         print(f"🔍 Quick scanning {subnet}.0/24 ...")
-        common_ips = [1, 254]  # Router/Gateway IPs
         
-        scan_results = scan_subnet(subnet, 1, 254)
+        scan_results = await scan_subnet_async(subnet, 1, 254, method)
         
         all_devices = arp_devices.union(set(scan_results))
         
         if local_ip:
             all_devices.discard(local_ip)
         
-        return sorted(list(all_devices),
-                     key=lambda x: [int(p) for p in x.split('.')])
+        return _sort_ips(all_devices)
+    
+    return _sort_ips(arp_devices)
+
+
+def get_all_network_devices(method: str = "ping") -> List[str]:
+    """
+    Get all devices on local network using ARP + active scanning
     
-    return sorted(list(arp_devices),
-                 key=lambda x: [int(p) for p in x.split('.')])
+    Returns:
+        List of all device IPs (from ARP + scan)
+    """
+    return asyncio.run(get_all_network_devices_async(method))
 
 
 if __name__ == "__main__":
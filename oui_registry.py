@@ -0,0 +1,204 @@
+"""
+OUI Registry
+Compact, memory-mapped IEEE MAC prefix (MA-L / MA-M / MA-S) vendor lookup
+
+The registry file is built offline from the public IEEE CSVs:
+
+    python oui_registry.py build oui.csv mam.csv oui36.csv [-o oui.bin]
+
+Layout (little endian):
+    header   8s magic, uint32 entry count, uint32 section count,
+             then per section: uint32 prefix bits, uint32 first, uint32 count
+    prefixes uint64 per entry, sorted within each section
+    offsets  uint32 per entry into the name blob
+    blob     NUL-terminated UTF-8 vendor names (deduplicated)
+
+Lookups bisect the mapped prefix array directly, so opening the file
+costs nothing per entry. MA-M and MA-S blocks are carved out of a few
+hundred MA-L blocks; only MACs under one of those search the finer
+sections, so most lookups are a single bisect.
+"""
+import bisect
+import csv
+import mmap
+import os
+import struct
+import sys
+from typing import Iterable, List, Optional, Tuple
+
+
+MAGIC = b"EQOUI\x00\x01\x00"
+HEADER = struct.Struct("<8sII")
+SECTION = struct.Struct("<III")
+SECTION_BITS = (24, 28, 36)  # MA-L, MA-M, MA-S
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "oui.bin")
+
+REGISTRY_BITS = {
+    "MA-L": 24,
+    "MA-M": 28,
+    "MA-S": 36,
+    "IAB": 36
+}
+
+
+def mac_to_int(mac: str) -> Optional[int]:
+    """48-bit integer for a MAC in any of the usual separator styles"""
+    digits = mac.replace(':', '').replace('-', '').replace('.', '')
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+def read_ieee_csv(path: str) -> Iterable[Tuple[int, int, str]]:
+    """Yield (bits, prefix, organization) from an IEEE registry CSV"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            assignment = (row.get("Assignment") or "").strip()
+            bits = REGISTRY_BITS.get((row.get("Registry") or "").strip())
+            if not assignment or bits is None or len(assignment) * 4 != bits:
+                continue
+            name = (row.get("Organization Name") or "").strip()
+            yield bits, int(assignment, 16), name
+
+
+def build_registry(csv_paths: List[str], output: str = DEFAULT_PATH) -> int:
+    """Build the binary registry from IEEE CSVs; returns the entry count"""
+    sections = {bits: {} for bits in SECTION_BITS}
+    for path in csv_paths:
+        for bits, prefix, name in read_ieee_csv(path):
+            sections[bits][prefix] = name
+
+    names = {}
+    blob = bytearray()
+    prefixes, offsets, layout = [], [], []
+    for bits in SECTION_BITS:
+        entries = sorted(sections[bits].items())
+        layout.append((bits, len(prefixes), len(entries)))
+        for prefix, name in entries:
+            offset = names.get(name)
+            if offset is None:
+                offset = names[name] = len(blob)
+                blob += name.encode('utf-8') + b"\x00"
+            prefixes.append(prefix)
+            offsets.append(offset)
+
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(prefixes), len(layout)))
+        for section in layout:
+            f.write(SECTION.pack(*section))
+        f.write(struct.pack(f"<{len(prefixes)}Q", *prefixes))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(blob)
+    os.replace(tmp_path, output)
+    return len(prefixes)
+
+
+class OUIRegistry:
+    """Read-only view of a built registry file"""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, section_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not an OUI registry file")
+
+        pos = HEADER.size
+        self._sections = []
+        for _ in range(section_count):
+            self._sections.append(SECTION.unpack_from(self._map, pos))
+            pos += SECTION.size
+
+        view = memoryview(self._map)
+        self._prefixes = view[pos:pos + count * 8].cast("Q")
+        pos += count * 8
+        self._offsets = view[pos:pos + count * 4].cast("I")
+        self._blob_start = pos + count * 4
+        self._names = {}
+
+        self._sections = {bits: (first, first + count)
+                          for bits, first, count in self._sections}
+        # MA-L blocks that contain MA-M / MA-S assignments
+        self._parents = frozenset(
+            self._prefixes[i] >> (bits - 24)
+            for bits, (first, end) in self._sections.items() if bits > 24
+            for i in range(first, end)
+        )
+        self._fine_order = sorted(
+            (bits for bits in self._sections if bits > 24), reverse=True
+        )
+
+    def __len__(self):
+        return len(self._prefixes)
+
+    def _name(self, index: int) -> str:
+        start = self._blob_start + self._offsets[index]
+        name = self._names.get(start)
+        if name is None:
+            end = self._map.find(b"\x00", start)
+            name = self._names[start] = self._map[start:end].decode('utf-8')
+        return name
+
+    def _find(self, bits: int, key: int) -> int:
+        lo, hi = self._sections.get(bits, (0, 0))
+        i = bisect.bisect_left(self._prefixes, key, lo, hi)
+        return i if i < hi and self._prefixes[i] == key else -1
+
+    def lookup(self, mac: str) -> Optional[str]:
+        """Organization name for a MAC, or None if unregistered"""
+        value = mac_to_int(mac)
+        if value is None:
+            return None
+        if value >> 24 in self._parents:
+            for bits in self._fine_order:
+                i = self._find(bits, value >> (48 - bits))
+                if i >= 0:
+                    return self._name(i)
+        i = self._find(24, value >> 24)
+        return self._name(i) if i >= 0 else None
+
+    def close(self):
+        self._prefixes.release()
+        self._offsets.release()
+        self._map.close()
+
+
+def load_registry(path: str = DEFAULT_PATH) -> Optional[OUIRegistry]:
+    """Open the registry file, or None if it has not been built"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return OUIRegistry(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not load OUI registry {path}: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "build":
+        args = sys.argv[2:]
+        output = DEFAULT_PATH
+        if "-o" in args:
+            i = args.index("-o")
+            output = args[i + 1]
+            args = args[:i] + args[i + 2:]
+        count = build_registry(args, output)
+        print(f"✅ Wrote {count} prefixes to {output}")
+    elif len(sys.argv) > 1:
+        registry = load_registry()
+        if registry is None:
+            print(f"❌ No registry at {DEFAULT_PATH}; run the build command first")
+            sys.exit(1)
+        for mac in sys.argv[1:]:
+            print(f"{mac}: {registry.lookup(mac) or 'Unknown'}")
+    else:
+        print("Usage: python oui_registry.py build <csv>... [-o oui.bin]")
+        print("       python oui_registry.py <mac>...")
@@ -0,0 +1,59 @@
+"""
+Snapshot
+Immutable, pre-encoded view of one update-loop tick for the read endpoints
+"""
+import gzip
+import hashlib
+import json
+from types import MappingProxyType
+from typing import Dict, NamedTuple, Optional
+
+
+GZIP_MIN_SIZE = 256  # bytes; smaller bodies are not worth compressing
+
+
+class Body(NamedTuple):
+    data: bytes
+    gzipped: Optional[bytes]
+    etag: str
+
+
+def encode_body(payload) -> Body:
+    """Serialize, precompress and fingerprint one response body"""
+    data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    gzipped = (gzip.compress(data, compresslevel=6, mtime=0)
+               if len(data) >= GZIP_MIN_SIZE else None)
+    etag = hashlib.blake2b(data, digest_size=8).hexdigest()
+    return Body(data, gzipped, etag)
+
+
+class Snapshot:
+    """
+    Encoded response bodies for one tick
+
+    Built once by the update loop and then only read; the loop publishes a
+    new instance by rebinding a single reference, so a request always sees
+    one complete tick. ETags are content hashes, so a body that did not
+    change between ticks still answers a conditional request with 304.
+    """
+    __slots__ = ("version", "bodies")
+
+    def __init__(self, version: int, payloads: Dict[str, object]):
+        self.version = version
+        self.bodies = MappingProxyType({name: encode_body(payload)
+                                        for name, payload in payloads.items()})
+
+    def __setattr__(self, name, value):
+        if hasattr(self, "bodies"):
+            raise AttributeError("Snapshot is immutable")
+        object.__setattr__(self, name, value)
+
+    def get(self, name: str) -> Optional[Body]:
+        return self.bodies.get(name)
+
+    def combined(self, names) -> str:
+        """One JSON object of the named bodies, reusing their encoded bytes"""
+        parts = []
+        for name in names:
+            parts.append(f'"{name}":' + self.bodies[name].data.decode('utf-8'))
+        return "{" + ",".join(parts) + "}"
@@ -0,0 +1,81 @@
+"""
+State Store
+Copy-on-write server state with a single writer thread
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping
+
+
+class StateStore:
+    """
+    Shared state read without locks and changed only through commands
+
+    `snapshot()` returns the current read-only mapping; it never changes
+    after it is published, so readers can iterate it while writes happen.
+    Every change is a command - a function that edits a draft copy of the
+    top-level dict - run one at a time on the writer thread, which then
+    publishes the draft as the new snapshot.
+
+    Commands must replace nested values rather than mutate them
+    (`merge` and `set` do this), otherwise older snapshots would change
+    under their readers.
+    """
+
+    def __init__(self, initial: Dict[str, Any]):
+        self._state = MappingProxyType(dict(initial))
+        self._commands = queue.Queue()
+        self.version = 0
+        self._writer = threading.Thread(
+            target=self._run, name="state-writer", daemon=True
+        )
+        self._writer.start()
+
+    def snapshot(self) -> Mapping[str, Any]:
+        return self._state
+
+    def __getitem__(self, key: str) -> Any:
+        return self._state[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._state.get(key, default)
+
+    def submit(self, command: Callable[[Dict[str, Any]], Any]) -> Future:
+        """Queue a command; the future resolves to its return value"""
+        future = Future()
+        self._commands.put((command, future))
+        return future
+
+    def apply(self, command: Callable[[Dict[str, Any]], Any]) -> Any:
+        """Run a command and wait until its result is published"""
+        if threading.current_thread() is self._writer:
+            raise RuntimeError("apply() called from inside a command")
+        return self.submit(command).result()
+
+    def set(self, **values):
+        """Replace top-level values"""
+        self.apply(lambda draft: draft.update(values))
+
+    def merge(self, **updates: Dict):
+        """Merge dict updates into nested dicts, e.g. merge(priorities={ip: 3})"""
+        def command(draft):
+            for key, values in updates.items():
+                draft[key] = {**draft[key], **values}
+        self.apply(command)
+
+    def _run(self):
+        while True:
+            command, future = self._commands.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            draft = dict(self._state)
+            try:
+                result = command(draft)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            self._state = MappingProxyType(draft)
+            self.version += 1
+            future.set_result(result)
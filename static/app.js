@@ -161,17 +161,79 @@ function initCharts() {
     });
 }
 
+function setText(id, text) {
+    const element = document.getElementById(id);
+    if (element) element.textContent = text;
+}
+
+function renderStatus(data) {
+    setText('total-clients', data.total_clients);
+    setText('upload-speed', data.network_stats.sent + ' KB/s');
+    setText('download-speed', data.network_stats.recv + ' KB/s');
+    setText('total-bandwidth', data.total_bandwidth + ' Mbps');
+    updateLastUpdate();
+}
+
+function renderClientsTable(clients) {
+    const tbody = document.getElementById('clients-tbody');
+    if (!tbody) return;
+    
+    if (clients.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="6" class="loading">No clients connected</td></tr>';
+        return;
+    }
+    
+    tbody.innerHTML = clients.map(client => `
+        <tr>
+            <td>
+                <div style="display: flex; align-items: center; gap: 8px;">
+                    <span style="font-size: 20px;">${client.icon || '📱'}</span>
+                    <div>
+                        <strong>${client.friendly_name || client.ip}</strong>
+                        <br>
+                        <small style="color: rgba(255,255,255,0.6); font-size: 11px;">${client.ip}</small>
+                    </div>
+                </div>
+            </td>
+            <td>
+                <span class="badge ${getPriorityClass(client.priority)}">
+                    ${client.priority}
+                </span>
+            </td>
+            <td>${client.usage} Mbps</td>
+            <td>${client.allocated} Mbps</td>
+            <td>
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: ${Math.min(client.usage_percent, 100)}%"></div>
+                </div>
+                ${client.usage_percent}%
+            </td>
+            <td>
+                <button class="btn-small" onclick="editPriority('${client.ip}', ${client.priority})" style="margin: 2px;">
+                    📝 Edit
+                </button>
+                <button class="btn-small" onclick="editDeviceName('${client.ip}')" style="margin: 2px; background: #4caf50;">
+                    🏷️ Rename
+                </button>
+            </td>
+        </tr>
+    `).join('');
+    
+    updateDistributionChart(clients);
+}
+
+function renderTrafficChart(history) {
+    if (!trafficChart) return;
+    trafficChart.data.labels = history.time;
+    trafficChart.data.datasets[0].data = history.upload;
+    trafficChart.data.datasets[1].data = history.download;
+    trafficChart.update('none');
+}
+
 async function updateStatus() {
     try {
         const response = await fetch(`${API_URL}/status`);
-        const data = await response.json();
-        
-        document.getElementById('total-clients').textContent = data.total_clients;
-        document.getElementById('upload-speed').textContent = data.network_stats.sent + ' KB/s';
-        document.getElementById('download-speed').textContent = data.network_stats.recv + ' KB/s';
-        document.getElementById('total-bandwidth').textContent = data.total_bandwidth + ' Mbps';
-        
-        updateLastUpdate();
+        renderStatus(await response.json());
     } catch (error) {
         console.error('Error updating status:', error);
     }
@@ -180,53 +242,7 @@ async function updateStatus() {
 async function updateClientsTable() {
     try {
         const response = await fetch(`${API_URL}/clients`);
-        const clients = await response.json();
-        
-        const tbody = document.getElementById('clients-tbody');
-        
-        if (clients.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="6" class="loading">No clients connected</td></tr>';
-            return;
-        }
-        
-        tbody.innerHTML = clients.map(client => `
-            <tr>
-                <td>
-                    <div style="display: flex; align-items: center; gap: 8px;">
-                        <span style="font-size: 20px;">${client.icon || '📱'}</span>
-                        <div>
-                            <strong>${client.friendly_name || client.ip}</strong>
-                            <br>
-                            <small style="color: rgba(255,255,255,0.6); font-size: 11px;">${client.ip}</small>
-                        </div>
-                    </div>
-                </td>
-                <td>
-                    <span class="badge ${getPriorityClass(client.priority)}">
-                        ${client.priority}
-                    </span>
-                </td>
-                <td>${client.usage} Mbps</td>
-                <td>${client.allocated} Mbps</td>
-                <td>
-                    <div class="progress-bar">
-                        <div class="progress-fill" style="width: ${Math.min(client.usage_percent, 100)}%"></div>
-                    </div>
-                    ${client.usage_percent}%
-                </td>
-                <td>
-                    <button class="btn-small" onclick="editPriority('${client.ip}', ${client.priority})" style="margin: 2px;">
-                        📝 Edit
-                    </button>
-                    <button class="btn-small" onclick="editDeviceName('${client.ip}')" style="margin: 2px; background: #4caf50;">
-                        🏷️ Rename
-                    </button>
-                </td>
-            </tr>
-        `).join('');
-        
-        updateDistributionChart(clients);
-        
+        renderClientsTable(await response.json());
     } catch (error) {
         console.error('Error updating clients:', error);
     }
@@ -235,19 +251,14 @@ async function updateClientsTable() {
 async function updateTrafficChart() {
     try {
         const response = await fetch(`${API_URL}/history`);
-        const history = await response.json();
-        
-        trafficChart.data.labels = history.time;
-        trafficChart.data.datasets[0].data = history.upload;
-        trafficChart.data.datasets[1].data = history.download;
-        trafficChart.update('none');
-        
+        renderTrafficChart(await response.json());
     } catch (error) {
         console.error('Error updating traffic chart:', error);
     }
 }
 
 function updateDistributionChart(clients) {
+    if (!distributionChart) return;
     const labels = clients.map(c => c.ip);
     const data = clients.map(c => c.allocated);
     
@@ -353,9 +364,7 @@ function showNotification(message, type = 'success') {
 }
 
 function updateLastUpdate() {
-    const now = new Date();
-    const timeString = now.toLocaleTimeString();
-    document.getElementById('last-update').textContent = timeString;
+    setText('last-update', new Date().toLocaleTimeString());
 }
 
 window.onclick = function(event) {
@@ -365,16 +374,59 @@ window.onclick = function(event) {
     }
 }
 
+let pollTimer = null;
+
+function publishSnapshot(snapshot) {
+    document.dispatchEvent(new CustomEvent('equalnet:snapshot', { detail: snapshot }));
+    renderStatus(snapshot.status);
+    renderClientsTable(snapshot.clients);
+    renderTrafficChart(snapshot.history);
+}
+
+// Fallback while the stream is down; the page listens for the same event,
+// so this is the only poller
+async function pollAll() {
+    try {
+        const [status, clients, history] = await Promise.all(
+            ['status', 'clients', 'history'].map(name =>
+                fetch(`${API_URL}/${name}`).then(response => response.json()))
+        );
+        publishSnapshot({ status, clients, history });
+    } catch (error) {
+        console.error('Error polling dashboard data:', error);
+    }
+}
+
+function startPolling() {
+    if (pollTimer) return;
+    pollAll();
+    pollTimer = setInterval(pollAll, 2000);
+}
+
+function stopPolling() {
+    if (!pollTimer) return;
+    clearInterval(pollTimer);
+    pollTimer = null;
+}
+
 function startUpdateLoop() {
-    updateStatus();
-    updateClientsTable();
-    updateTrafficChart();
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    
+    // One pushed snapshot per server tick; poll only while the stream is down
+    const source = new EventSource(`${API_URL}/stream`);
+    
+    source.addEventListener('snapshot', (event) => {
+        stopPolling();
+        publishSnapshot(JSON.parse(event.data));
+    });
     
-    setInterval(() => {
-        updateStatus();
-        updateClientsTable();
-        updateTrafficChart();
-    }, 2000);
+    source.onerror = () => {
+        console.warn('Live stream unavailable, falling back to polling');
+        startPolling();
+    };
 }
 
 // CSV Export Functions
@@ -0,0 +1,356 @@
+"""
+Per-Client Traffic Sources
+Pluggable per-IP byte counters and a tracker that turns counter
+snapshots into per-client upload/download rates
+"""
+import csv
+import ipaddress
+from abc import ABC, abstractmethod
+import os
+import platform
+import re
+import shutil
+import subprocess
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+Counters = Dict[str, Tuple[int, int]]  # ip -> (bytes_up, bytes_down)
+
+
+class ClientRate(NamedTuple):
+    upload: float  # KB/s sent by the client
+    download: float  # KB/s received by the client
+
+    @property
+    def mbps(self) -> float:
+        """Combined rate in Mbps (the unit LoadBalancer works in)"""
+        return (self.upload + self.download) * 1024 * 8 / 1_000_000
+
+
+class CounterSource(ABC):
+    """
+    Base class for per-client byte counters
+
+    read() returns (monotonic timestamp, {ip: (bytes_up, bytes_down)})
+    with cumulative counters for every client seen, taken in one bulk
+    call. Counters only grow; the tracker handles resets defensively.
+    """
+    name = "none"
+
+    def __init__(self, client_network: str = None):
+        self.client_network = (
+            ipaddress.ip_network(client_network, strict=False)
+            if client_network else None
+        )
+
+    def is_client(self, ip: str) -> bool:
+        """Whether an address belongs to a local client"""
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if self.client_network is not None:
+            return addr in self.client_network
+        return addr.is_private and not addr.is_loopback
+
+    @abstractmethod
+    def available(self) -> bool:
+        """Whether this source can run on this machine"""
+
+    @abstractmethod
+    def read(self) -> Tuple[float, Counters]:
+        """Take one bulk counter snapshot"""
+
+    def close(self):
+        pass
+
+
+CONNTRACK_ENTRY = re.compile(
+    r'^(?:ipv[46]\s+\d+\s+)?(?P<proto>\w+)\s+\d+\s+(?:\d+\s+)?.*?'
+    r'src=(?P<src>\S+)\s+dst=(?P<dst>\S+)\s+'
+    r'(?:sport=(?P<sport>\d+)\s+dport=(?P<dport>\d+)\s+)?.*?'
+    r'bytes=(?P<orig_bytes>\d+).*?'
+    r'src=\S+\s+dst=\S+\s+.*?bytes=(?P<reply_bytes>\d+)'
+)
+
+
+class ConntrackSource(CounterSource):
+    """
+    Per-IP counters from netfilter connection tracking (Linux)
+
+    Needs flow accounting (sysctl net.netfilter.nf_conntrack_acct=1).
+    Reads /proc/net/nf_conntrack when present, otherwise one
+    `conntrack -L -o extended` call. Per-flow byte deltas are folded into
+    per-IP totals so counters stay monotonic as flows expire.
+    """
+    name = "conntrack"
+    PROC_PATH = "/proc/net/nf_conntrack"
+
+    def __init__(self, client_network: str = None):
+        super().__init__(client_network)
+        self._flows = {}
+        self._totals = {}
+
+    def available(self) -> bool:
+        if platform.system().lower() != 'linux':
+            return False
+        if os.access(self.PROC_PATH, os.R_OK):
+            return self._accounting_enabled()
+        return shutil.which("conntrack") is not None and self._accounting_enabled()
+
+    @staticmethod
+    def _accounting_enabled() -> bool:
+        try:
+            with open("/proc/sys/net/netfilter/nf_conntrack_acct") as f:
+                return f.read().strip() == "1"
+        except OSError:
+            return False
+
+    def _dump(self) -> str:
+        if os.access(self.PROC_PATH, os.R_OK):
+            with open(self.PROC_PATH) as f:
+                return f.read()
+        result = subprocess.run(
+            ['conntrack', '-L', '-o', 'extended'],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+        return result.stdout
+
+    def parse(self, dump: str) -> Dict[tuple, Tuple[str, int, int]]:
+        """Parse a conntrack dump into flow -> (client ip, up, down)"""
+        flows = {}
+        for line in dump.splitlines():
+            match = CONNTRACK_ENTRY.search(line)
+            if not match:
+                continue
+            src, dst = match.group('src'), match.group('dst')
+            orig, reply = int(match.group('orig_bytes')), int(match.group('reply_bytes'))
+            key = (match.group('proto'), src, dst,
+                   match.group('sport'), match.group('dport'))
+            if self.is_client(src):
+                flows[key] = (src, orig, reply)
+            elif self.is_client(dst):
+                flows[key] = (dst, reply, orig)
+        return flows
+
+    def read(self) -> Tuple[float, Counters]:
+        flows = self.parse(self._dump())
+        now = time.monotonic()
+
+        for key, (ip, up, down) in flows.items():
+            last_up, last_down = self._flows.get(key, (0, 0))
+            total_up, total_down = self._totals.get(ip, (0, 0))
+            self._totals[ip] = (
+                total_up + max(0, up - last_up),
+                total_down + max(0, down - last_down)
+            )
+        self._flows = {key: (up, down) for key, (_, up, down) in flows.items()}
+
+        return now, dict(self._totals)
+
+
+class IptablesSource(CounterSource):
+    """
+    Per-IP counters from an iptables accounting chain (Linux, root)
+
+    Keeps one `-s ip` and one `-d ip` RETURN rule per client in the
+    EQUALNET_ACCT chain (jumped to from FORWARD) and reads every counter
+    with a single `iptables -nvxL` call. close() removes the chain.
+    """
+    name = "iptables"
+    CHAIN = "EQUALNET_ACCT"
+
+    def __init__(self, client_network: str = None, binary: str = "iptables"):
+        super().__init__(client_network)
+        self.binary = binary
+        self._tracked = set()
+        self._ready = False
+
+    def _run(self, *args) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [self.binary, '-w', *args],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+
+    def available(self) -> bool:
+        if platform.system().lower() != 'linux' or os.geteuid() != 0:
+            return False
+        return shutil.which(self.binary) is not None
+
+    def _ensure_chain(self):
+        if self._ready:
+            return
+        self._run('-N', self.CHAIN)
+        if self._run('-C', 'FORWARD', '-j', self.CHAIN).returncode != 0:
+            self._run('-I', 'FORWARD', '-j', self.CHAIN)
+        self._ready = True
+
+    def track(self, ips: List[str]):
+        """Keep accounting rules for exactly the given clients"""
+        self._ensure_chain()
+        wanted = {ip for ip in ips if self.is_client(ip)}
+        for ip in self._tracked - wanted:
+            self._run('-D', self.CHAIN, '-s', ip, '-j', 'RETURN')
+            self._run('-D', self.CHAIN, '-d', ip, '-j', 'RETURN')
+            self._tracked.discard(ip)
+        for ip in wanted - self._tracked:
+            self._run('-A', self.CHAIN, '-s', ip, '-j', 'RETURN')
+            self._run('-A', self.CHAIN, '-d', ip, '-j', 'RETURN')
+            self._tracked.add(ip)
+
+    def parse(self, listing: str) -> Counters:
+        """Parse `iptables -nvxL CHAIN` output into per-IP counters"""
+        counters = {}
+        for line in listing.splitlines():
+            parts = line.split()
+            if len(parts) < 9 or not parts[0].isdigit():
+                continue
+            byte_count = int(parts[1])
+            src, dst = parts[7], parts[8]
+            if src != '0.0.0.0/0':
+                ip = src.split('/')[0]
+                up, down = counters.get(ip, (0, 0))
+                counters[ip] = (up + byte_count, down)
+            elif dst != '0.0.0.0/0':
+                ip = dst.split('/')[0]
+                up, down = counters.get(ip, (0, 0))
+                counters[ip] = (up, down + byte_count)
+        return counters
+
+    def read(self) -> Tuple[float, Counters]:
+        self._ensure_chain()
+        result = self._run('-nvxL', self.CHAIN)
+        return time.monotonic(), self.parse(result.stdout)
+
+    def close(self):
+        if self._ready:
+            self._run('-D', 'FORWARD', '-j', self.CHAIN)
+            self._run('-F', self.CHAIN)
+            self._run('-X', self.CHAIN)
+            self._ready = False
+            self._tracked.clear()
+
+
+class ReplaySource(CounterSource):
+    """
+    Replays recorded counters from a CSV trace (for tests and demos)
+
+    The file has a `time,ip,bytes_up,bytes_down` header; rows sharing a
+    time form one snapshot and each read() returns the next snapshot.
+    The trace's own time column is used as the clock. Once a
+    non-looping trace is exhausted the clock keeps advancing with the
+    counters unchanged, so clients read as idle.
+    """
+    name = "replay"
+
+    def __init__(self, path: str, loop: bool = False):
+        super().__init__()
+        self.path = path
+        self.loop = loop
+        self._snapshots = self._load(path)
+        self._position = 0
+        self._offset = 0.0
+
+    @staticmethod
+    def _load(path: str) -> List[Tuple[float, Counters]]:
+        snapshots = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                t = float(row['time'])
+                snapshots.setdefault(t, {})[row['ip']] = (
+                    int(row['bytes_up']), int(row['bytes_down'])
+                )
+        return sorted(snapshots.items())
+
+    def available(self) -> bool:
+        return bool(self._snapshots)
+
+    def read(self) -> Tuple[float, Counters]:
+        if self._position >= len(self._snapshots):
+            if not self.loop:
+                t, counters = self._snapshots[-1]
+                step = t - self._snapshots[-2][0] if len(self._snapshots) > 1 else 1.0
+                self._offset += step
+                return t + self._offset, counters
+            first, last = self._snapshots[0][0], self._snapshots[-1][0]
+            self._offset += last - first + 1
+            self._position = 0
+        t, counters = self._snapshots[self._position]
+        self._position += 1
+        return t + self._offset, counters
+
+
+class ClientRateTracker:
+    """Turns cumulative counter snapshots into per-client rates"""
+
+    def __init__(self, source: CounterSource):
+        self.source = source
+        self._last_time = None
+        self._last = {}
+        self.rates = {}
+
+    def sample(self, clients: List[str] = None) -> Dict[str, ClientRate]:
+        """Read the source once and return {ip: ClientRate}"""
+        if clients is not None and hasattr(self.source, "track"):
+            self.source.track(clients)
+
+        now, counters = self.source.read()
+        if self._last_time is None or now <= self._last_time:
+            # Nothing to measure against yet (or the clock did not move)
+            self._last_time, self._last = now, counters
+            self.rates = {}
+            return self.rates
+
+        elapsed = now - self._last_time
+        rates = {}
+        for ip, (up, down) in counters.items():
+            last_up, last_down = self._last.get(ip, (up, down))
+            # A counter that went backwards was reset; count it as idle
+            delta_up = up - last_up if up >= last_up else 0
+            delta_down = down - last_down if down >= last_down else 0
+            rates[ip] = ClientRate(
+                delta_up / elapsed / 1024,
+                delta_down / elapsed / 1024
+            )
+
+        self._last_time, self._last = now, counters
+        self.rates = rates
+        return rates
+
+
+def get_default_source(client_network: str = None) -> Optional[CounterSource]:
+    """Pick the first per-client counter source this machine supports"""
+    for source in (ConntrackSource(client_network),
+                   IptablesSource(client_network)):
+        try:
+            if source.available():
+                return source
+        except Exception as e:
+            print(f"⚠️ Traffic source {source.name} unavailable: {e}")
+    return None
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        tracker = ClientRateTracker(ReplaySource(sys.argv[1]))
+    else:
+        source = get_default_source()
+        if source is None:
+            print("❌ No per-client traffic source available on this machine")
+            sys.exit(1)
+        print(f"📡 Using {source.name} counters")
+        tracker = ClientRateTracker(source)
+
+    for _ in range(5):
+        for ip, rate in sorted(tracker.sample().items()):
+            print(f"  {ip:15s} ↑{rate.upload:8.2f} KB/s ↓{rate.download:8.2f} KB/s")
+        print("-" * 50)
+        if len(sys.argv) == 1:
+            time.sleep(1)
@@ -1,4 +1,5 @@
 import psutil
+import threading
 import time
 
 
@@ -9,3 +10,101 @@ def get_bandwidth_usage(interval=1):
     sent = (after.bytes_sent - before.bytes_sent) / 1024
     recv = (after.bytes_recv - before.bytes_recv) / 1024
     return sent, recv
+
+
+class TrafficSampler:
+    """
+    Background NIC counter sampler
+
+    Reads psutil.net_io_counters(pernic=True) every `interval` seconds on
+    a fixed monotonic schedule into ring buffers of (timestamp, bytes_sent,
+    bytes_recv) per NIC, plus a "total" ring summed over all NICs. rate()
+    looks up the sample N slots back, so it is O(1) and never blocks.
+    """
+
+    TOTAL = "total"
+
+    def __init__(self, interval=0.5, history_seconds=300):
+        self.interval = interval
+        self.capacity = int(history_seconds / interval) + 1
+        self._times = [0.0] * self.capacity
+        self._rings = {}
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self.sample()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    def _run(self):
+        next_time = time.monotonic() + self.interval
+        while not self._stop.wait(max(0.0, next_time - time.monotonic())):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️ Traffic sampler error: {e}")
+            next_time += self.interval
+            now = time.monotonic()
+            if next_time < now:
+                # Fell behind (suspend, slow read): skip missed slots
+                next_time = now + self.interval
+
+    def sample(self):
+        """Take one counter reading into the ring buffers"""
+        counters = psutil.net_io_counters(pernic=True)
+        now = time.monotonic()
+        total_sent = sum(c.bytes_sent for c in counters.values())
+        total_recv = sum(c.bytes_recv for c in counters.values())
+
+        with self._lock:
+            slot = self._head
+            self._times[slot] = now
+            readings = [(nic, c.bytes_sent, c.bytes_recv) for nic, c in counters.items()]
+            readings.append((self.TOTAL, total_sent, total_recv))
+            for nic, sent, recv in readings:
+                ring = self._rings.get(nic)
+                if ring is None:
+                    # New NIC: backfill so its history reads as idle
+                    ring = self._rings[nic] = ([sent] * self.capacity,
+                                               [recv] * self.capacity)
+                ring[0][slot] = sent
+                ring[1][slot] = recv
+            self._head = (slot + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    @property
+    def nics(self):
+        with self._lock:
+            return [nic for nic in self._rings if nic != self.TOTAL]
+
+    def rate(self, window=1.0, nic=None):
+        """
+        Average (sent, recv) in KB/s over the last `window` seconds
+        (clamped to the history held); (0, 0) until two samples exist
+        """
+        with self._lock:
+            ring = self._rings.get(nic or self.TOTAL)
+            if ring is None or self._count < 2:
+                return 0.0, 0.0
+            steps = max(1, min(self._count - 1, round(window / self.interval)))
+            newest = (self._head - 1) % self.capacity
+            oldest = (newest - steps) % self.capacity
+            elapsed = self._times[newest] - self._times[oldest]
+            if elapsed <= 0:
+                return 0.0, 0.0
+            sent = max(0, ring[0][newest] - ring[0][oldest])
+            recv = max(0, ring[1][newest] - ring[1][oldest])
+        return sent / elapsed / 1024, recv / elapsed / 1024